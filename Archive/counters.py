@@ -0,0 +1,101 @@
+"""
+Write-behind view and download counters for archive files.
+
+A hit only adds to an in-process tally; `counter_buffer` writes the tallies
+every ARCHIVE_COUNTER_FLUSH_INTERVAL seconds, or once
+ARCHIVE_COUNTER_FLUSH_SIZE files are pending, from its timer thread
+(lms1/buffering.py) as `F('views') + n` updates. Files with the same pending
+amounts share one UPDATE. Being relative, the updates from several processes
+add up instead of overwriting each other, and since update() sends no
+post_save the search index is left alone.
+
+With ARCHIVE_COUNTER_WRITE_BEHIND off every hit is written straight away,
+still as a single relative UPDATE.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+
+from lms1.buffering import WriteBehindBuffer
+
+from .models import File
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('views', 'downloads')
+
+
+class CounterBuffer(WriteBehindBuffer):
+    """
+    In-process tally of view and download hits per file:
+    file_id -> [views, downloads]. Amounts whose UPDATE fails are added
+    back for the next flush.
+    """
+    interval_setting = 'ARCHIVE_COUNTER_FLUSH_INTERVAL'
+    default_interval = 10
+    size_setting = 'ARCHIVE_COUNTER_FLUSH_SIZE'
+    default_size = 500
+
+    def add(self, file_id, field, amount=1):
+        """
+        Count `amount` hits of `field` for a file. Returns the amount now
+        pending for that file and field.
+        """
+        index = FIELDS.index(field)
+        counts = [0] * len(FIELDS)
+        counts[index] = amount
+        with self._lock:
+            merged = self._pending[file_id] = self.merge(self._pending.get(file_id), counts)
+            pending = merged[index]
+        self.flush_when_due()
+        return pending
+
+    def pending(self, file_id):
+        """{field: amount} not yet written for a file."""
+        with self._lock:
+            counts = self._pending.get(file_id, [0] * len(FIELDS))
+        return dict(zip(FIELDS, counts))
+
+    def merge(self, current, counts):
+        if current is None:
+            return list(counts)
+        return [a + b for a, b in zip(current, counts)]
+
+    def write(self, pending):
+        """Returns the number of files updated."""
+        by_amounts = defaultdict(list)
+        for file_id, counts in pending.items():
+            by_amounts[tuple(counts)].append(file_id)
+
+        updated = 0
+        for counts, file_ids in by_amounts.items():
+            try:
+                updated += File.objects.filter(pk__in=file_ids).update(**{
+                    field: F(field) + amount for field, amount in zip(FIELDS, counts) if amount
+                })
+            except Exception:
+                logger.exception("Archive counter flush failed for %d files; re-queueing", len(file_ids))
+                self.requeue({file_id: counts for file_id in file_ids})
+        return updated
+
+
+counter_buffer = CounterBuffer()
+
+
+def write_behind_enabled():
+    return getattr(settings, 'ARCHIVE_COUNTER_WRITE_BEHIND', True)
+
+
+def count_hit(file, field):
+    """
+    Count one view or download of `file` and bump the in-memory value so the
+    response includes it, along with any hits still waiting to be flushed.
+    """
+    if write_behind_enabled():
+        pending = counter_buffer.add(file.pk, field)
+    else:
+        File.objects.filter(pk=file.pk).update(**{field: F(field) + 1})
+        pending = 1
+    setattr(file, field, getattr(file, field) + pending)
@@ -0,0 +1,153 @@
+"""
+Document text extraction for archive uploads.
+
+After an upload commits, the file id is handed to a small thread pool. The
+worker pulls the text out of the stored document (PyMuPDF for PDFs, with
+pytesseract OCR for pages that have no text layer; plain text files are
+read as is), stores it in FileText and reindexes the file, so search covers
+document bodies without the upload request waiting for any of it.
+
+ARCHIVE_EXTRACTION_WORKERS sets the pool size; 0 runs extraction inline,
+which is what the management command and the tests use.
+"""
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import File, FileText
+from .search import search_backend
+
+logger = logging.getLogger(__name__)
+
+PDF_EXTENSIONS = {'.pdf'}
+TEXT_EXTENSIONS = {'.txt', '.md', '.csv'}
+
+# Pages with fewer characters than this are treated as scans and OCR'd.
+OCR_MIN_CHARS = 20
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def extract_pdf(path):
+    """Return (text, pages, ocr_pages) for a PDF."""
+    import fitz  # PyMuPDF
+
+    max_pages = setting('ARCHIVE_EXTRACTION_MAX_PAGES', 200)
+    use_ocr = setting('ARCHIVE_EXTRACTION_OCR', True)
+    parts, ocr_pages = [], 0
+    with fitz.open(path) as document:
+        pages = min(document.page_count, max_pages)
+        for number in range(pages):
+            page = document.load_page(number)
+            text = page.get_text('text')
+            if use_ocr and len(text.strip()) < OCR_MIN_CHARS:
+                ocr_text = ocr_page(page)
+                if ocr_text:
+                    text, ocr_pages = ocr_text, ocr_pages + 1
+            parts.append(text)
+    return '\n'.join(parts), pages, ocr_pages
+
+
+def ocr_page(page):
+    import pytesseract
+    from PIL import Image
+
+    pixmap = page.get_pixmap(dpi=setting('ARCHIVE_EXTRACTION_OCR_DPI', 200))
+    image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+    return pytesseract.image_to_string(image)
+
+
+def extract_plain(path):
+    with open(path, 'rb') as handle:
+        return handle.read().decode('utf-8', errors='replace'), 1, 0
+
+
+def extract_text(file_id):
+    """
+    Extract and store the text of one file, then reindex it. Returns the
+    FileText row, or None if the file is gone.
+    """
+    file = File.objects.filter(pk=file_id).only('pk', 'file').first()
+    if file is None or not file.file:
+        return None
+
+    extension = os.path.splitext(file.file.name)[1].lower()
+    fields = {'text': '', 'pages': 0, 'ocr_pages': 0, 'error': ''}
+    if extension in PDF_EXTENSIONS:
+        extractor = extract_pdf
+    elif extension in TEXT_EXTENSIONS:
+        extractor = extract_plain
+    else:
+        extractor = None
+
+    if extractor is None:
+        fields['status'] = FileText.Status.UNSUPPORTED
+    else:
+        try:
+            text, fields['pages'], fields['ocr_pages'] = extractor(file.file.path)
+        except Exception as exc:  # a bad upload must not kill the worker
+            logger.exception("Text extraction failed for archive file %s", file_id)
+            fields.update(status=FileText.Status.FAILED, error=str(exc)[:500])
+        else:
+            # tsvector values are capped at 1MB
+            fields.update(
+                status=FileText.Status.DONE,
+                text=text.replace('\x00', '')[:setting('ARCHIVE_EXTRACTION_MAX_CHARS', 500_000)],
+            )
+
+    with transaction.atomic():
+        if not File.objects.filter(pk=file_id).exists():
+            return None  # deleted while we were reading it
+        row, _ = FileText.objects.update_or_create(
+            file_id=file_id, defaults={**fields, 'extracted_at': timezone.now()}
+        )
+        search_backend().index([file_id])
+    return row
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=setting('ARCHIVE_EXTRACTION_WORKERS', 2),
+                thread_name_prefix='archive-extract',
+            )
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _run(file_id):
+    try:
+        extract_text(file_id)
+    except Exception:
+        logger.exception("Text extraction worker crashed for archive file %s", file_id)
+    finally:
+        connections.close_all()  # this worker thread's connections only
+
+
+def schedule_extraction(file_id):
+    """
+    Queue extraction once the current transaction commits. Marks the file
+    pending right away so the row shows what is going on.
+    """
+    FileText.objects.update_or_create(
+        file_id=file_id,
+        defaults={'status': FileText.Status.PENDING, 'text': '', 'error': ''},
+    )
+    if setting('ARCHIVE_EXTRACTION_WORKERS', 2) <= 0:
+        transaction.on_commit(lambda: extract_text(file_id))
+    else:
+        transaction.on_commit(lambda: executor().submit(_run, file_id))
@@ -0,0 +1,105 @@
+"""
+Category and tag counts for the archive sidebar.
+
+Each facet is one grouped COUNT over the files matching the current search
+and the *other* facet's filter, so picking a category still shows how many
+files every other category would give, and likewise for tags.
+
+Results are cached per normalized filter set under a version key. Any file
+upload, edit, delete or retag bumps the version (Archive/signals.py), which
+retires every cached facet block at once.
+
+The version and the blocks live in the cache named by ARCHIVE_FACET_CACHE.
+With several workers that alias must be a backend they all share (Redis,
+Memcached, the database...): a bump in a process-local cache only reaches
+the worker that made it, and the others keep serving stale counts until
+ARCHIVE_FACET_CACHE_TIMEOUT.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+
+from .models import File
+
+FACET_CACHE_ALIAS = getattr(settings, 'ARCHIVE_FACET_CACHE', 'default')
+VERSION_KEY = 'archive-facets:version'
+
+
+def facet_cache():
+    return caches[FACET_CACHE_ALIAS]
+
+
+def _new_version():
+    # Time based, so a version lost to eviction never points back at old blobs.
+    return time.time_ns()
+
+
+def get_version():
+    cache = facet_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached facet block."""
+    cache = facet_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _new_version(), timeout=None)
+
+
+def filter_key(category, tags, search):
+    """The same digest for filters that select the same files."""
+    parts = [
+        category if category and category != "All" else "",
+        ",".join(sorted(set(tags))),
+        " ".join((search or "").lower().split()),
+    ]
+    return hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+def count_facets(matching, category, tags):
+    """
+    {"categories": [...], "tags": [...]} of {"name", "count"} for the files
+    in `matching` (already narrowed by the search), most common first.
+    """
+    by_category = (
+        matching.tagged(tags).order_by()
+        .values("category__name")
+        .annotate(count=Count("pk"))
+    )
+    by_tag = (
+        File.tags.through.objects
+        .filter(file__in=matching.in_category(category).order_by().values("pk"))
+        .values("tag__name")
+        .annotate(count=Count("file_id"))
+    )
+    return {
+        "categories": _ranked((row["category__name"], row["count"]) for row in by_category),
+        "tags": _ranked((row["tag__name"], row["count"]) for row in by_tag),
+    }
+
+
+def _ranked(counts):
+    return [
+        {"name": name, "count": count}
+        for name, count in sorted(counts, key=lambda item: (-item[1], item[0]))
+    ]
+
+
+def facets(matching, category, tags, search):
+    """count_facets(), served from the cache while no file has changed."""
+    key = f"archive-facets:{get_version()}:{filter_key(category, tags, search)}"
+    cache = facet_cache()
+    block = cache.get(key)
+    if block is None:
+        block = count_facets(matching, category, tags)
+        cache.set(key, block, getattr(settings, 'ARCHIVE_FACET_CACHE_TIMEOUT', 300))
+    return block
@@ -0,0 +1,44 @@
+"""
+Process-level cache for the category and tag lists.
+
+Both lists are fetched on every archive page load and change a few times a
+year, so each worker keeps the serialized list in memory. Saving or deleting
+a category or tag drops the entry in this process (Archive/signals.py);
+other workers notice after ARCHIVE_LOOKUP_CACHE_TIMEOUT seconds at most.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+
+class LookupCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # name -> (expires_at, data)
+
+    def get(self, name, load):
+        """The cached value for `name`, or `load()` stored until it expires."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        data = load()
+        with self._lock:
+            self._entries[name] = (now + self.timeout(), data)
+        return data
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries = {}
+            else:
+                self._entries.pop(name, None)
+
+    @staticmethod
+    def timeout():
+        return getattr(settings, 'ARCHIVE_LOOKUP_CACHE_TIMEOUT', 300)
+
+
+lookup_cache = LookupCache()
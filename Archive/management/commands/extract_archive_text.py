@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from Archive.extraction import extract_text
+from Archive.models import File, FileText
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract document text for archive files inline (no worker pool). "
+        "By default only files without finished extraction are processed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_ids', nargs='*', type=int, help="Only these files.")
+        parser.add_argument('--all', action='store_true', help="Re-extract every file.")
+
+    def handle(self, *args, **options):
+        files = File.objects.order_by('pk')
+        if options['file_ids']:
+            files = files.filter(pk__in=options['file_ids'])
+        elif not options['all']:
+            files = files.exclude(extracted_text__status=FileText.Status.DONE)
+
+        counts = {}
+        for file_id in files.values_list('pk', flat=True).iterator():
+            row = extract_text(file_id)
+            if row is not None:
+                counts[row.status] = counts.get(row.status, 0) + 1
+        summary = ', '.join(f"{status}: {count}" for status, count in sorted(counts.items())) or "nothing to do"
+        self.stdout.write(self.style.SUCCESS(f"Extracted archive text ({summary})."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Archive.search import search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the archive full-text search index from the File table."
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search index with {type(backend).__name__}."))
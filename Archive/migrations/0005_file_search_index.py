@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:47
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Backend-specific half of Archive/search.py: a GIN index over the
+    tsvector on PostgreSQL, an FTS5 table on SQLite. Both are filled from
+    the existing rows.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'UPDATE "Archive_file" SET search_vector = '
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+        )
+        schema_editor.execute(
+            'CREATE INDEX archive_file_search_gin ON "Archive_file" USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE archive_file_fts USING fts5('
+            "title, description, tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(
+            'INSERT INTO archive_file_fts (rowid, title, description) '
+            'SELECT id, title, description FROM "Archive_file"'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS archive_file_search_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS archive_file_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0004_file_external_link_alter_file_author_alter_file_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_fts_body_column(apps, schema_editor):
+    """FTS5 tables can't be altered; recreate it with the extracted text column."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS archive_file_fts')
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE archive_file_fts USING fts5('
+        "title, description, body, tokenize = 'porter unicode61')"
+    )
+    schema_editor.execute(
+        'INSERT INTO archive_file_fts (rowid, title, description, body) '
+        "SELECT id, title, description, '' FROM \"Archive_file\""
+    )
+
+
+def drop_fts_body_column(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS archive_file_fts')
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE archive_file_fts USING fts5('
+        "title, description, tokenize = 'porter unicode61')"
+    )
+    schema_editor.execute(
+        'INSERT INTO archive_file_fts (rowid, title, description) '
+        'SELECT id, title, description FROM "Archive_file"'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0005_file_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileText',
+            fields=[
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='extracted_text', serialize=False, to='Archive.file')),
+                ('text', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed'), ('unsupported', 'Unsupported')], default='pending', max_length=20)),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('ocr_pages', models.PositiveIntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('extracted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(add_fts_body_column, drop_fts_body_column),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0006_filetext'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['-upload_date', '-id'], name='file_upload_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Copied rather than imported from Archive.models, so later edits to the
+# defaults don't rewrite history.
+CATEGORIES = ["Research Materials", "Project Documentation", "Key Achievements"]
+TAGS = ["Sustainability", "Research", "AI", "Innovation", "Achievements", "Summary"]
+
+
+def seed_defaults(apps, schema_editor):
+    """
+    Create the predefined categories and tags once, instead of on every
+    Category.get_all() / Tag.get_all() call.
+    """
+    db = schema_editor.connection.alias
+    Category = apps.get_model('Archive', 'Category')
+    Tag = apps.get_model('Archive', 'Tag')
+    Category.objects.using(db).bulk_create([Category(name=name) for name in CATEGORIES], ignore_conflicts=True)
+    Tag.objects.using(db).bulk_create([Tag(name=name) for name in TAGS], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0007_file_listing_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_defaults, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from Auths.models import CustomUser  # Ensure this matches the correct app name
@@ -8,26 +10,26 @@ class Category(models.Model):
     """
     Model representing predefined categories for files.
     """
+    DEFAULTS = ["Research Materials", "Project Documentation", "Key Achievements"]
+
     name = models.CharField(max_length=100, unique=True)
 
     def __str__(self):
         return self.name
 
-    @staticmethod
-    def initialize_defaults():
+    @classmethod
+    def initialize_defaults(cls):
         """
-        Create predefined categories if they do not already exist.
+        Create predefined categories if they do not already exist. Migration
+        0008 does this once; one INSERT, whatever is already there.
         """
-        default_categories = ["Research Materials", "Project Documentation", "Key Achievements"]
-        for category in default_categories:
-            Category.objects.get_or_create(name=category)
+        cls.objects.bulk_create([cls(name=name) for name in cls.DEFAULTS], ignore_conflicts=True)
 
     @classmethod
     def get_all(cls):
         """
-        Ensure the defaults are initialized before fetching all categories.
+        All categories; the defaults are seeded by migration 0008.
         """
-        cls.initialize_defaults()
         return cls.objects.all()
 
 
@@ -35,29 +37,78 @@ class Tag(models.Model):
     """
     Model representing predefined tags for files.
     """
+    DEFAULTS = ["Sustainability", "Research", "AI", "Innovation", "Achievements", "Summary"]
+
     name = models.CharField(max_length=50, unique=True)
 
     def __str__(self):
         return self.name
 
-    @staticmethod
-    def initialize_defaults():
+    @classmethod
+    def initialize_defaults(cls):
         """
-        Create predefined tags if they do not already exist.
+        Create predefined tags if they do not already exist. Migration 0008
+        does this once; one INSERT, whatever is already there.
         """
-        default_tags = ["Sustainability", "Research", "AI", "Innovation", "Achievements", "Summary"]
-        for tag in default_tags:
-            Tag.objects.get_or_create(name=tag)
+        cls.objects.bulk_create([cls(name=name) for name in cls.DEFAULTS], ignore_conflicts=True)
 
     @classmethod
     def get_all(cls):
         """
-        Ensure the defaults are initialized before fetching all tags.
+        All tags; the defaults are seeded by migration 0008.
         """
-        cls.initialize_defaults()
         return cls.objects.all()
 
 
+def count_subquery(model, file_lookup='file'):
+    """
+    Correlated COUNT(*) of `model` rows pointing at the outer File, so the
+    like and comment counts don't multiply each other's rows.
+    """
+    counted = (
+        model.objects.filter(**{file_lookup: models.OuterRef('pk')})
+        .order_by()
+        .values(file_lookup)
+        .annotate(total=models.Count('pk'))
+        .values('total')
+    )
+    return Coalesce(models.Subquery(counted), 0)
+
+
+class FileQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Everything FileSerializer renders, in a constant number of queries:
+        author and category joined, tags prefetched, like/comment counts
+        annotated.
+        """
+        return (
+            self.select_related('author', 'category')
+            .prefetch_related('tags')
+            .annotate(
+                likes_count=count_subquery(Like),
+                comments_count=count_subquery(Comment),
+            )
+        )
+
+    def in_category(self, name):
+        """Files in the named category; "All" or empty means no filter."""
+        if not name or name == "All":
+            return self
+        return self.filter(category__name=name)
+
+    def tagged(self, names):
+        """
+        Files carrying any of the named tags. A subquery rather than a join,
+        so a file with several of them is still returned once, without DISTINCT.
+        """
+        if not names:
+            return self
+        return self.filter(
+            pk__in=File.tags.through.objects.filter(tag__name__in=names).values("file_id")
+        )
+
+
 class File(models.Model):
     """
     Model representing a file in the archive.
@@ -82,6 +133,17 @@ class File(models.Model):
     )
     views = models.PositiveIntegerField(default=0)
     downloads = models.PositiveIntegerField(default=0)
+    # Weighted title/description tsvector, maintained by Archive/search.py.
+    # Only used on PostgreSQL, where migration 0005 adds its GIN index.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = FileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the listing (Archive/pagination.py).
+            models.Index(fields=['-upload_date', '-id'], name='file_upload_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author.get_full_name()}"
@@ -97,17 +159,42 @@ class File(models.Model):
 
     def increment_views(self):
         """
-        Increment the view count for the file.
+        Count a view of the file (see Archive/counters.py).
         """
-        self.views += 1
-        self.save()
+        from .counters import count_hit
+        count_hit(self, "views")
 
     def increment_downloads(self):
         """
-        Increment the download count for the file.
+        Count a download of the file (see Archive/counters.py).
         """
-        self.downloads += 1
-        self.save()
+        from .counters import count_hit
+        count_hit(self, "downloads")
+
+
+class FileText(models.Model):
+    """
+    Text extracted from a file's document (Archive/extraction.py), kept out
+    of the File row so listing files never loads it. Feeds the search index.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+        UNSUPPORTED = 'unsupported', 'Unsupported'
+
+    file = models.OneToOneField(
+        File, on_delete=models.CASCADE, primary_key=True, related_name="extracted_text"
+    )
+    text = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    pages = models.PositiveIntegerField(default=0)
+    ocr_pages = models.PositiveIntegerField(default=0)
+    error = models.CharField(max_length=500, blank=True)
+    extracted_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Text of file {self.file_id} ({self.status})"
 
 
 class Comment(models.Model):
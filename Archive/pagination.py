@@ -0,0 +1,112 @@
+# Archive/pagination.py
+"""
+Pagination for the archive file listing.
+
+Browsing pages by keyset: files come newest first on (upload_date, id) and
+the opaque `cursor` names the last file of the previous page, so page 1000
+costs the same index range scan as page 1 and no COUNT is needed.
+`total_pages` is only added when asked for with `?total=true`, and then
+from the planner's row estimate when the listing is unfiltered on
+PostgreSQL.
+
+Search results are ordered by rank, which has no stable key to seek on, so
+they keep `?page=` numbers with an exact count; a text match is already
+narrow.
+"""
+import base64
+import binascii
+import math
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+
+
+class FilePagination:
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    total_query_param = 'total'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, request):
+        self.request = request
+        self.page_size = self.get_page_size()
+        self.data = {}
+
+    def get_page_size(self):
+        try:
+            size = int(self.request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def wants_total(self):
+        return self.request.query_params.get(self.total_query_param, '').lower() in ('1', 'true')
+
+    def paginate_keyset(self, files):
+        """The page after the requested cursor, newest first."""
+        files = files.order_by('-upload_date', '-id')
+        position = self.decode_cursor(self.request.query_params.get(self.cursor_query_param))
+        if self.wants_total():
+            self.data['total_pages'] = self.pages(estimated_count(files))
+        if position is not None:
+            upload_date, pk = position
+            files = files.filter(Q(upload_date__lt=upload_date) | Q(upload_date=upload_date, pk__lt=pk))
+
+        # One extra row tells us whether there is a next page.
+        page = list(files[:self.page_size + 1])
+        has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.data['next_cursor'] = self.encode_cursor(page[-1]) if has_next else None
+        return page
+
+    def paginate_numbered(self, files):
+        """A numbered page of an already ordered queryset (search results)."""
+        try:
+            number = max(int(self.request.query_params.get(self.page_query_param, 1)), 1)
+        except ValueError:
+            number = 1
+        self.data['total_pages'] = self.pages(files.count())
+        start = (number - 1) * self.page_size
+        return list(files[start:start + self.page_size])
+
+    def pages(self, count):
+        return math.ceil(count / self.page_size)
+
+    @staticmethod
+    def encode_cursor(file):
+        position = f'{file.upload_date.isoformat()}|{file.pk}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            upload_date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            position = parse_datetime(upload_date), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+
+def estimated_count(files):
+    """
+    The row count of `files`: the planner's estimate from pg_class when it
+    is the whole unfiltered table on PostgreSQL, an exact COUNT otherwise.
+    """
+    if connection.vendor == 'postgresql' and not files.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [connection.ops.quote_name(files.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:  # -1 until the table is first analyzed
+            return row[0]
+    return files.count()
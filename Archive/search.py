@@ -0,0 +1,165 @@
+"""
+Full-text search over archive files.
+
+FileListView hands its already filtered queryset to `search_backend().search()`,
+so category and tag filters combine with the text match. Backends:
+
+- PostgresSearchBackend: weighted tsvector (title A, description B,
+  extracted document text C) in File.search_vector with a GIN index,
+  prefix-matching tsquery, ranked with ts_rank.
+- SQLiteSearchBackend: an FTS5 virtual table keyed by file id, ranked with
+  bm25(); used for local development and tests.
+- IcontainsSearchBackend: the old title/description icontains scan, for any
+  other database.
+
+The index is kept up to date from File's post_save/post_delete signals
+(Archive/signals.py) and after text extraction (Archive/extraction.py).
+`manage.py rebuild_archive_search` rebuilds it.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import File, FileText
+
+# Letters and digits only: both tsquery and FTS5 have their own operators.
+TERM_RE = re.compile(r'[^\W_]+')
+MAX_TERMS = 8
+
+# Columns that feed the index; saves touching none of them skip reindexing.
+INDEXED_FIELDS = frozenset({'title', 'description'})
+
+
+def search_terms(query):
+    return TERM_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+class IcontainsSearchBackend:
+    def index(self, file_ids):
+        pass
+
+    def remove(self, file_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, files, query):
+        return files.filter(Q(title__icontains=query) | Q(description__icontains=query))
+
+
+class PostgresSearchBackend:
+    config = 'english'
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+        body = Coalesce(
+            Subquery(FileText.objects.filter(file=OuterRef('pk')).values('text')[:1]), Value('')
+        )
+        return (
+            SearchVector('title', weight='A', config=self.config)
+            + SearchVector('description', weight='B', config=self.config)
+            + SearchVector(body, weight='C', config=self.config)
+        )
+
+    def index(self, file_ids):
+        File.objects.filter(pk__in=file_ids).update(search_vector=self.vector())
+
+    def remove(self, file_ids):
+        pass  # the vector lives on the deleted row
+
+    def rebuild(self):
+        File.objects.update(search_vector=self.vector())
+
+    def search(self, files, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        terms = search_terms(query)
+        if not terms:
+            return files
+        # Every term prefix-matched, so results follow the user as they type.
+        tsquery = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=self.config
+        )
+        return (
+            files.filter(search_vector=tsquery)
+            .annotate(search_rank=SearchRank(F('search_vector'), tsquery))
+            .order_by('-search_rank', '-upload_date', '-id')
+        )
+
+
+class SQLiteSearchBackend:
+    table = 'archive_file_fts'
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def _source(self):
+        return connection.ops.quote_name(File._meta.db_table)
+
+    def _select(self, where=''):
+        texts = connection.ops.quote_name(FileText._meta.db_table)
+        return (
+            f'INSERT INTO {self.table} (rowid, title, description, body) '
+            f"SELECT f.id, f.title, f.description, coalesce(t.text, '') "
+            f'FROM {self._source()} f LEFT JOIN {texts} t ON t.file_id = f.id {where}'
+        )
+
+    def index(self, file_ids):
+        file_ids = list(file_ids)
+        if not file_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(file_ids))
+        self.remove(file_ids)
+        self._execute(self._select(f'WHERE f.id IN ({placeholders})'), file_ids)
+
+    def remove(self, file_ids):
+        file_ids = list(file_ids)
+        if file_ids:
+            placeholders = ', '.join(['%s'] * len(file_ids))
+            self._execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', file_ids)
+
+    def rebuild(self):
+        self._execute(f'DELETE FROM {self.table}')
+        self._execute(self._select())
+
+    def search(self, files, query):
+        terms = search_terms(query)
+        if not terms:
+            return files
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matching = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', (match,))
+        # bm25() is lower-is-better; negate it so both backends sort on -search_rank.
+        # Weights follow the tsvector ones: title, description, document text.
+        rank = RawSQL(
+            f'(SELECT -bm25({self.table}, 4.0, 2.0, 1.0) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {self._source()}.id)',
+            (match,),
+        )
+        return (
+            files.filter(pk__in=matching)
+            .annotate(search_rank=rank)
+            .order_by('-search_rank', '-upload_date', '-id')
+        )
+
+
+BACKENDS = {
+    'postgresql': 'Archive.search.PostgresSearchBackend',
+    'sqlite': 'Archive.search.SQLiteSearchBackend',
+}
+
+
+def search_backend():
+    """
+    The backend named by settings.ARCHIVE_SEARCH_BACKEND, or the one that
+    matches the database vendor.
+    """
+    path = getattr(settings, 'ARCHIVE_SEARCH_BACKEND', None) or BACKENDS.get(
+        connection.vendor, 'Archive.search.IcontainsSearchBackend'
+    )
+    return import_string(path)()
@@ -24,6 +24,10 @@ class TagSerializer(serializers.ModelSerializer):
 class FileSerializer(serializers.ModelSerializer):
     """
     Serializer for File model, including nested relationships.
+
+    Reads `likes_count` / `comments_count` annotations when the file comes
+    from File.objects.for_listing(), and the `liked_file_ids` context entry
+    (see Archive/views.py) for is_liked; both fall back to a query per file.
     """
     category = serializers.SlugRelatedField(
         slug_field='name', queryset=Category.objects.all()
@@ -57,13 +61,15 @@ class FileSerializer(serializers.ModelSerializer):
         """
         Returns the total number of likes for the file.
         """
-        return obj.likes.count()
+        count = getattr(obj, 'likes_count', None)
+        return obj.likes.count() if count is None else count
 
     def get_comments_count(self, obj):
         """
         Returns the total number of comments for the file.
         """
-        return obj.comments.count()
+        count = getattr(obj, 'comments_count', None)
+        return obj.comments.count() if count is None else count
 
     def get_file_url(self, obj):
         """
@@ -79,9 +85,12 @@ class FileSerializer(serializers.ModelSerializer):
         Checks if the current user has liked the file.
         """
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return obj.likes.filter(user=user).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        liked_ids = self.context.get('liked_file_ids')
+        if liked_ids is not None:
+            return obj.id in liked_ids
+        return obj.likes.filter(user=user).exists()
 
 
 class CommentSerializer(serializers.ModelSerializer):
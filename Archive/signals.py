@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from .facets import bump_version
+from .lookups import lookup_cache
+from .models import Category, File, Tag
+from .search import INDEXED_FIELDS, search_backend
+
+
+@receiver(post_save, sender=File)
+def index_file(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and not INDEXED_FIELDS & set(update_fields)):
+        return
+    search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=File)
+def unindex_file(sender, instance, **kwargs):
+    search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def drop_facets_on_file_change(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(bump_version)
+
+
+@receiver(m2m_changed, sender=File.tags.through)
+def drop_facets_on_retag(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def drop_cached_lookups(sender, raw=False, **kwargs):
+    if raw:
+        return
+    name = 'categories' if sender is Category else 'tags'
+
+    def invalidate():
+        lookup_cache.invalidate(name)
+        bump_version()  # facet blocks carry the names too
+
+    transaction.on_commit(invalidate)
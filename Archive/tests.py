@@ -1,3 +1,455 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from urllib.parse import quote
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Auths.models import CustomUser
+from lms1.streaming import serve_media
+from .counters import CounterBuffer, counter_buffer
+from .extraction import extract_text
+from .facets import facet_cache
+from .lookups import lookup_cache
+from .models import Category, Comment, Tag, File, FileText, Like
+from .pagination import FilePagination
+from .search import search_backend
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        facet_cache().clear()
+        self.client = APIClient()
+        self.author = CustomUser.objects.create_user(
+            username="author", email="author@example.com", password="pass",
+            first_name="Ar", last_name="Chivist",
+        )
+        # Seeded by migration 0008.
+        self.research = Category.objects.get(name="Research Materials")
+        self.docs = Category.objects.get(name="Project Documentation")
+        self.ai = Tag.objects.get(name="AI")
+        self.summary = Tag.objects.get(name="Summary")
+
+    def make_file(self, title, description="", category=None, tags=(), **extra):
+        file = File.objects.create(
+            title=title, description=description, category=category or self.research,
+            author=self.author, file=f"uploaded_files/{title.replace(' ', '_')}.pdf", **extra,
+        )
+        file.tags.set(tags or [self.ai])
+        return file
+
+    def list_files(self, **params):
+        response = self.client.get('/archive/files/', params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+
+class FileSearchTests(ArchiveTestCase):
+    def titles(self, **params):
+        return [file['title'] for file in self.list_files(**params)['files']]
+
+    def test_prefix_terms_are_ranked_title_first(self):
+        self.make_file("Solar grid report", "Annual figures")
+        self.make_file("Annual summary", "Notes on the solar panels")
+        self.make_file("Unrelated", "Nothing to see")
+        self.assertEqual(self.titles(search="sol"), ["Solar grid report", "Annual summary"])
+        self.assertEqual(self.titles(search="panel"), ["Annual summary"])
+
+    def test_search_combines_with_category_and_tags(self):
+        self.make_file("Robotics notes", tags=[self.ai])
+        self.make_file("Robotics summary", tags=[self.ai, self.summary])
+        self.make_file("Robotics plan", category=self.docs, tags=[self.summary])
+        self.assertEqual(
+            sorted(self.titles(search="robotics", tags=["Summary"])),
+            ["Robotics plan", "Robotics summary"],
+        )
+        self.assertEqual(
+            self.titles(search="robotics", tags=["Summary"], category="Project Documentation"),
+            ["Robotics plan"],
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        file = self.make_file("Draft", "first version")
+        file.title = "Final report"
+        file.save()
+        self.assertEqual(self.titles(search="final"), ["Final report"])
+        self.assertEqual(self.titles(search="draft"), [])
+        file.delete()
+        self.assertEqual(self.titles(search="final"), [])
+
+    def test_operators_in_user_input_are_ignored(self):
+        self.make_file("C++ primer", "pointers and references")
+        self.assertEqual(self.titles(search='"primer" OR NOT*'), [])
+        self.assertEqual(self.titles(search='primer: (pointers)'), ["C++ primer"])
+
+    def test_rebuild_restores_a_lost_index(self):
+        self.make_file("Orbital mechanics")
+        search_backend().remove(File.objects.values_list('pk', flat=True))
+        self.assertEqual(self.titles(search="orbital"), [])
+        search_backend().rebuild()
+        self.assertEqual(self.titles(search="orbital"), ["Orbital mechanics"])
+
+
+@override_settings(ARCHIVE_EXTRACTION_WORKERS=0)
+class TextExtractionTests(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.client.force_authenticate(self.author)
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/archive/files/upload/', {
+                'title': 'Field notes', 'description': 'Quarterly',
+                'category': 'Research Materials', 'tags': ['AI'],
+                'file': SimpleUploadedFile(name, content),
+            }, format='multipart', secure=True)
+        self.assertEqual(response.status_code, 201, response.data)
+        return FileText.objects.get(file_id=response.data['id'])
+
+    def test_uploaded_document_body_is_searchable(self):
+        text = self.upload('notes.txt', b'Observations about migrating cranes')
+        self.assertEqual(text.status, FileText.Status.DONE)
+        self.assertIn('cranes', text.text)
+        titles = [file['title'] for file in self.list_files(search='crane')['files']]
+        self.assertEqual(titles, ['Field notes'])
+
+    def test_unreadable_and_unsupported_documents_are_recorded(self):
+        with self.assertLogs('Archive.extraction', 'ERROR'):
+            self.assertEqual(self.upload('broken.pdf', b'not really a pdf').status, FileText.Status.FAILED)
+        self.assertEqual(self.upload('image.bin', b'\x00\x01').status, FileText.Status.UNSUPPORTED)
+
+    def test_extraction_skips_deleted_files(self):
+        text = self.upload('notes.txt', b'body')
+        file_id = text.file_id
+        File.objects.filter(pk=file_id).delete()
+        self.assertIsNone(extract_text(file_id))
+        self.assertFalse(FileText.objects.filter(file_id=file_id).exists())
+
+
+class FileListQueryTests(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader = CustomUser.objects.create_user(
+            username="reader", email="reader@example.com", password="pass",
+        )
+        self.client.force_authenticate(self.reader)
+
+    def populate(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._populate(count)
+
+    def _populate(self, count):
+        for i in range(count):
+            file = self.make_file(f"File {i}", tags=[self.ai, self.summary])
+            Like.objects.create(file=file, user=self.author)
+            if i % 2:
+                Like.objects.create(file=file, user=self.reader)
+            Comment.objects.create(file=file, user=self.author, text="one")
+            Comment.objects.create(file=file, user=self.reader, text="two")
+
+    def page_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.list_files()
+        return data, len(ctx.captured_queries)
+
+    def test_page_query_count_is_constant(self):
+        self.populate(1)
+        _, one = self.page_queries()
+        self.populate(4)
+        data, five = self.page_queries()
+        self.assertEqual(len(data['files']), 5)
+        # page with counts, tags, current user's likes and, on a facet cache
+        # miss, the two facet aggregates; no COUNT
+        self.assertEqual(one, 5)
+        self.assertEqual(five, one)
+
+    def test_counts_and_is_liked(self):
+        self.populate(2)
+        files = {file['title']: file for file in self.list_files()['files']}
+        self.assertEqual(
+            [(files[t]['likes_count'], files[t]['comments_count'], files[t]['is_liked']) for t in ("File 0", "File 1")],
+            [(1, 2, False), (2, 2, True)],
+        )
+        self.assertEqual(files["File 1"]['author'], "Ar Chivist")
+        self.assertEqual(sorted(files["File 1"]['tags']), ["AI", "Summary"])
+
+
+class FileFacetTests(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_file("Solar notes", tags=[self.ai])
+            self.make_file("Solar summary", tags=[self.ai, self.summary])
+            self.make_file("Solar plan", category=self.docs, tags=[self.summary])
+            self.make_file("Wind plan", category=self.docs, tags=[self.summary])
+
+    def facets(self, **params):
+        facets = self.list_files(**params)['facets']
+        return (
+            [(row['name'], row['count']) for row in facets['categories']],
+            [(row['name'], row['count']) for row in facets['tags']],
+        )
+
+    def test_counts_follow_search_and_the_other_filter(self):
+        self.assertEqual(self.facets(search="solar"), (
+            [("Research Materials", 2), ("Project Documentation", 1)],
+            [("AI", 2), ("Summary", 2)],
+        ))
+        # A category keeps every category's count but narrows the tag counts.
+        self.assertEqual(self.facets(search="solar", category="Project Documentation"), (
+            [("Research Materials", 2), ("Project Documentation", 1)],
+            [("Summary", 1)],
+        ))
+        self.assertEqual(self.facets(tags=["Summary"])[0], [("Project Documentation", 2), ("Research Materials", 1)])
+
+    def test_facets_are_cached_until_a_file_changes(self):
+        self.list_files(search="Solar ")
+        with CaptureQueriesContext(connection) as ctx:
+            self.list_files(search="solar")
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            File.objects.get(title="Solar plan").delete()
+        self.assertEqual(self.facets(search="solar"), (
+            [("Research Materials", 2)], [("AI", 2), ("Summary", 1)],
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            File.objects.get(title="Solar notes").tags.add(self.summary)
+        self.assertEqual(self.facets(search="solar")[1], [("AI", 2), ("Summary", 2)])
+
+
+class LookupListTests(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        lookup_cache.invalidate()
+        self.addCleanup(lookup_cache.invalidate)
+
+    def names(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']], len(ctx.captured_queries)
+
+    def test_defaults_are_seeded_once(self):
+        self.assertEqual(list(Category.get_all().values_list('name', flat=True)), Category.DEFAULTS)
+        with CaptureQueriesContext(connection) as ctx:
+            Tag.get_all().count()
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_lists_are_served_from_memory_until_changed(self):
+        names, queries = self.names('/archive/categories/')
+        self.assertEqual((names, queries), (Category.DEFAULTS, 1))
+        self.assertEqual(self.names('/archive/categories/'), (Category.DEFAULTS, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="Robotics")
+        self.assertEqual(self.names('/archive/categories/')[1], 0)
+        self.assertEqual(self.names('/archive/tags/'), (Tag.DEFAULTS + ["Robotics"], 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(name="Robotics").get().delete()
+        self.assertEqual(self.names('/archive/tags/')[0], Tag.DEFAULTS)
+
+
+class FilePaginationTests(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        # Two files share each upload time, so the id has to break ties.
+        start = timezone.now()
+        self.files = [
+            self.make_file(f"File {i}", upload_date=start - timedelta(minutes=i // 2))
+            for i in range(7)
+        ]
+
+    def walk(self, **params):
+        titles, cursor = [], None
+        while True:
+            data = self.list_files(**params, **({'cursor': cursor} if cursor else {}))
+            titles.append([file['title'] for file in data['files']])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return titles
+
+    def test_keyset_pages_newest_first(self):
+        pages = self.walk(page_size=3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        expected = [f.title for f in sorted(self.files, key=lambda f: (f.upload_date, f.pk), reverse=True)]
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_page_size_is_capped_and_total_is_optional(self):
+        self.assertNotIn('total_pages', self.list_files())
+        self.assertEqual(self.list_files(total='true', page_size=2)['total_pages'], 4)
+        for i in range(FilePagination.max_page_size):
+            self.make_file(f"Extra {i}")
+        self.assertEqual(len(self.list_files(page_size=500)['files']), FilePagination.max_page_size)
+
+    def test_tag_filter_does_not_duplicate_files(self):
+        self.files[0].tags.add(self.summary)
+        pages = self.walk(tags=["AI", "Summary"], page_size=2)
+        self.assertEqual(len(sum(pages, [])), 7)
+
+    def test_search_keeps_numbered_pages(self):
+        data = self.list_files(search="file", page=2, page_size=3)
+        self.assertEqual((len(data['files']), data['total_pages']), (3, 3))
+        self.assertNotIn('next_cursor', data)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/archive/files/', {'cursor': 'bm9wZQ=='}, secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ARCHIVE_COUNTER_WRITE_BEHIND=True, ARCHIVE_COUNTER_FLUSH_INTERVAL=0)
+class FileCounterTests(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        counter_buffer.clear()
+        self.addCleanup(counter_buffer.clear)
+        self.file = self.make_file("Counted")
+
+    def hit(self, kind, file=None):
+        file = file or self.file
+        if kind == "downloads":
+            # The download endpoint streams bytes (see FileDownloadTests).
+            file = File.objects.get(pk=file.pk)
+            file.increment_downloads()
+            return file.downloads
+        response = self.client.get(f'/archive/files/{file.pk}/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.data["views"]
+
+    def stored(self):
+        return File.objects.values_list('views', 'downloads').get(pk=self.file.pk)
+
+    def test_hits_are_buffered_and_flushed_as_relative_updates(self):
+        self.assertEqual([self.hit("views") for _ in range(3)], [1, 2, 3])
+        self.assertEqual(self.hit("downloads"), 1)
+        other = self.make_file("Other")
+        self.hit("views", other)
+        self.assertEqual(self.stored(), (0, 0))
+
+        # A write that lands between hit and flush is kept, not overwritten.
+        File.objects.filter(pk=self.file.pk).update(views=10)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(counter_buffer.flush(), 2)
+        self.assertEqual(self.stored(), (13, 1))
+        self.assertEqual(File.objects.get(pk=other.pk).views, 1)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(len(counter_buffer), 0)
+
+    def test_size_threshold_wakes_the_flush_thread(self):
+        class Buffer(CounterBuffer):
+            woken = 0
+
+            def _flush_soon(self):
+                self.woken += 1
+
+        buffer = Buffer()
+        other = self.make_file("Other")
+        with override_settings(ARCHIVE_COUNTER_FLUSH_SIZE=2):
+            with CaptureQueriesContext(connection) as ctx:
+                buffer.add(self.file.pk, "views")
+                buffer.add(other.pk, "views")
+        # The hit that fills the buffer doesn't write it in the request.
+        self.assertEqual((buffer.woken, len(buffer), len(ctx.captured_queries)), (1, 2, 0))
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.stored(), (1, 0))
+
+    def test_hits_do_not_touch_the_search_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.hit("views")
+            counter_buffer.flush()
+        self.assertNotIn('fts', ' '.join(q['sql'] for q in ctx.captured_queries).lower())
+
+    @override_settings(ARCHIVE_COUNTER_WRITE_BEHIND=False)
+    def test_direct_writes_without_write_behind(self):
+        self.hit("views")
+        self.assertEqual(self.hit("downloads"), 1)
+        self.assertEqual(self.stored(), (1, 1))
+        self.assertEqual(len(counter_buffer), 0)
+
+
+@override_settings(ARCHIVE_COUNTER_WRITE_BEHIND=True, ARCHIVE_COUNTER_FLUSH_INTERVAL=0)
+class FileDownloadTests(ArchiveTestCase):
+    body = bytes(range(256)) * 40
+
+    def setUp(self):
+        super().setUp()
+        counter_buffer.clear()
+        self.addCleanup(counter_buffer.clear)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.file = self.make_file("Lecture")
+        self.file.file.save("lecture.mp4", ContentFile(self.body))
+        self.url = f'/archive/files/{self.file.pk}/download/'
+
+    def download(self, **headers):
+        response = self.client.get(self.url, secure=True, headers=headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def downloads(self):
+        return counter_buffer.pending(self.file.pk)['downloads']
+
+    def test_whole_file_is_streamed_with_validators(self):
+        response, content = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(content, self.body)
+        self.assertEqual(response['Content-Length'], str(len(self.body)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(self.downloads(), 1)
+
+        revalidated, _ = self.download(if_none_match=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.downloads(), 1)
+
+    def test_ranges(self):
+        response, content = self.download(range='bytes=100-199')
+        self.assertEqual((response.status_code, content), (206, self.body[100:200]))
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.body)}')
+        self.assertEqual(self.downloads(), 0)  # a seek is not a download
+
+        _, content = self.download(range='bytes=-10')
+        self.assertEqual(content, self.body[-10:])
+        response, content = self.download(range='bytes=0-')
+        self.assertEqual((response.status_code, content), (206, self.body))
+        self.assertEqual(self.downloads(), 1)
+
+        response, _ = self.download(range=f'bytes={len(self.body)}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.body)}'))
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response, content = self.download(range='bytes=0-9', if_range='"stale"')
+        self.assertEqual((response.status_code, len(content)), (200, len(self.body)))
+
+    def test_missing_blob_is_not_found(self):
+        self.file.file.storage.delete(self.file.file.name)
+        response = self.client.get(self.url, secure=True)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.downloads(), 0)
+
+    def test_media_directories_are_not_found(self):
+        for path in ('', os.path.dirname(self.file.file.name) + '/'):
+            with self.assertRaises(Http404):
+                serve_media(RequestFactory().get(f'/media/{path}'), path)
+
+    def test_accel_redirect_path_is_quoted(self):
+        self.file.file.save("leçon.mp4", ContentFile(self.body))
+        with override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/'):
+            response, _ = self.download()
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/' + quote(self.file.file.name),
+        )
+        self.assertIn('le%C3%A7on', response['X-Accel-Redirect'])
@@ -1,27 +1,66 @@
+from django.http import Http404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics, permissions
 from .models import Category, Tag, File, Comment, Like
 from .serializers import CategorySerializer, TagSerializer, FileSerializer, CommentSerializer, LikeSerializer
-from django.db.models import Q
+from .extraction import schedule_extraction
+from .facets import facets
+from .lookups import lookup_cache
+from .pagination import FilePagination
+from .search import search_backend
+from lms1.streaming import is_full_download, stream_file
 
 
-class CategoryListView(generics.ListAPIView):
+def file_context(request, files):
+    """
+    Serializer context for a page of files: the ids of those the current
+    user liked, fetched in one query.
+    """
+    context = {"request": request}
+    if request.user.is_authenticated:
+        context["liked_file_ids"] = set(
+            Like.objects.filter(user=request.user, file__in=[file.pk for file in files])
+            .values_list("file_id", flat=True)
+        )
+    return context
+
+
+class CachedListView(generics.ListAPIView):
+    """
+    List view whose serialized data is kept in the process-level lookup
+    cache (Archive/lookups.py) under `cache_name`; pages are cut from it.
+    """
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        data = lookup_cache.get(
+            self.cache_name, lambda: list(self.get_serializer(self.get_queryset(), many=True).data)
+        )
+        page = self.paginate_queryset(data)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(data)
+
+
+class CategoryListView(CachedListView):
     """
     View to list all categories.
     """
-    queryset = Category.objects.all()
+    queryset = Category.objects.order_by("pk")
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
+    cache_name = "categories"
 
 
-class TagListView(generics.ListAPIView):
+class TagListView(CachedListView):
     """
     View to list all tags.
     """
-    queryset = Tag.objects.all()
+    queryset = Tag.objects.order_by("pk")
     serializer_class = TagSerializer
     permission_classes = [permissions.AllowAny]
+    cache_name = "tags"
 
 
 class FileListView(APIView):
@@ -31,36 +70,30 @@ class FileListView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        files = File.objects.all()
+        files = File.objects.for_listing()
         category = request.query_params.get("category", "All")
         tags = request.query_params.getlist("tags", [])
         search = request.query_params.get("search", "")
-        page = int(request.query_params.get("page", 1))
-        files_per_page = 5
+        paginator = FilePagination(request)
 
-        # Filtering by category
-        if category and category != "All":
-            files = files.filter(category__name=category)
+        # Full-text search is ranked (Archive/search.py)
+        if search:
+            files = search_backend().search(files, search)
 
-        # Filtering by tags
-        if tags:
-            files = files.filter(tags__name__in=tags).distinct()
+        # Sidebar counts for the search, before its own filters narrow it down
+        facet_block = facets(files, category, tags, search)
 
-        # Searching by title or description
-        if search:
-            files = files.filter(Q(title__icontains=search) | Q(description__icontains=search))
+        files = files.in_category(category).tagged(tags)
 
-        # Pagination
-        total_files = files.count()
-        start = (page - 1) * files_per_page
-        end = start + files_per_page
-        files_paginated = files[start:end]
+        # Ranked search results are paged by number, plain browsing by keyset
+        # (Archive/pagination.py).
+        if search:
+            page = paginator.paginate_numbered(files)
+        else:
+            page = paginator.paginate_keyset(files)
 
-        serializer = FileSerializer(files_paginated, many=True, context={"request": request})
-        return Response({
-            "files": serializer.data,
-            "total_pages": (total_files // files_per_page) + (1 if total_files % files_per_page > 0 else 0)
-        })
+        serializer = FileSerializer(page, many=True, context=file_context(request, page))
+        return Response({"files": serializer.data, **paginator.data, "facets": facet_block})
 
 
 class FileDetailView(APIView):
@@ -71,9 +104,9 @@ class FileDetailView(APIView):
 
     def get(self, request, pk):
         try:
-            file = File.objects.get(pk=pk)
+            file = File.objects.for_listing().get(pk=pk)
             file.increment_views()
-            serializer = FileSerializer(file, context={"request": request})
+            serializer = FileSerializer(file, context=file_context(request, [file]))
             return Response(serializer.data)
         except File.DoesNotExist:
             return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -84,6 +117,8 @@ class FileDetailView(APIView):
             serializer = FileSerializer(file, data=request.data, partial=True, context={"request": request})
             if serializer.is_valid():
                 serializer.save()
+                if "file" in serializer.validated_data:
+                    schedule_extraction(file.pk)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except File.DoesNotExist:
@@ -107,7 +142,9 @@ class FileUploadView(APIView):
     def post(self, request):
         serializer = FileSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
-            serializer.save(author=request.user)
+            file = serializer.save(author=request.user)
+            # Document text is extracted in the background once this commits
+            schedule_extraction(file.pk)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -152,15 +189,19 @@ class CommentView(APIView):
 
 class FileDownloadView(APIView):
     """
-    View to handle file downloads and increment the download count.
+    Stream the stored file (lms1/streaming.py), with Range and conditional
+    GET support, and count the download.
     """
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get(self, request, pk):
+        file = File.objects.filter(pk=pk).only("pk", "file", "downloads").first()
+        if file is None or not file.file:
+            return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
         try:
-            file = File.objects.get(pk=pk)
-            file.increment_downloads()
-            serializer = FileSerializer(file, context={"request": request})
-            return Response(serializer.data)
-        except File.DoesNotExist:
+            response = stream_file(request, file.file, as_attachment=True)
+        except Http404:
             return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+        if is_full_download(request, response):
+            file.increment_downloads()  # buffered, see Archive/counters.py
+        return response
@@ -0,0 +1,10 @@
+# Auths/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class UserCursorPagination(CursorPagination):
+    """
+    Newest users first, paged by primary key so deep pages need no
+    COUNT(*) or OFFSET.
+    """
+    ordering = ('-id',)
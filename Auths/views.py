@@ -18,6 +18,7 @@ from .serializers import (
     AdminUserSerializer,
 )
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from .pagination import UserCursorPagination
 
 class RegisterView(generics.CreateAPIView):
     """
@@ -183,6 +184,7 @@ class UserListView(generics.ListAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    pagination_class = UserCursorPagination
 
 # --------------------------------------------------------------
 # NEW: UserDetailView for retrieving/updating/deleting a user (admin-only)
@@ -0,0 +1,80 @@
+# courses/caching.py
+"""
+Versioned cache for rendered course outlines.
+
+A course's content version is its `updated_at`, which courses/signals.py
+moves forward whenever anything in the tree changes. Rendered
+CourseSerializer / ModuleSerializer output is stored under a key that embeds
+that version, so a change retires every rendered blob of the course at once,
+in every worker, without having to find and delete them. The version lives
+in the database rather than in the cache, so a process-local cache can
+never keep serving (or 304-ing) an outline that has changed elsewhere.
+
+Per-user fields such as `is_enrolled` are never part of a cached blob; views
+add them after reading from the cache.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+OUTLINE_CACHE_ALIAS = getattr(settings, 'COURSE_OUTLINE_CACHE', 'outlines')
+
+
+def outline_cache():
+    return caches[OUTLINE_CACHE_ALIAS]
+
+
+def content_version(updated_at):
+    """Version of a course's content: its updated_at, in microseconds."""
+    return int(updated_at.timestamp() * 1_000_000)
+
+
+def request_variant(request, fields=None, expand=None):
+    """
+    Short digest of everything besides the course content that changes the
+    rendered output: the host (file fields render absolute URLs) and the
+    requested ?fields= / ?expand= shape.
+    """
+    parts = [
+        request.scheme if request is not None else '',
+        request.get_host() if request is not None else '',
+        ','.join(sorted(fields)) if fields is not None else '*',
+        ','.join(sorted(expand)) if expand is not None else '*',
+    ]
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()[:12]
+
+
+def outline_etag(kind, pk, version, variant, user_values=None):
+    """
+    Strong ETag for one rendered outline: content version, representation
+    variant and any per-user values that were added on top of the cached blob.
+    """
+    extra = ','.join(f'{name}={value}' for name, value in sorted((user_values or {}).items()))
+    digest = hashlib.md5(f'{version}|{variant}|{extra}'.encode()).hexdigest()[:16]
+    return f'"{kind}-{pk}-{digest}"'
+
+
+def cached_render(objects, version_of, kind, variant, render):
+    """
+    Return the rendered representation of each object, in order.
+
+    `version_of(obj)` gives the content version that guards the object,
+    `render(missing)` renders the cache misses and returns their data in the
+    same order. Only misses are rendered, and they are stored for next time.
+    """
+    objects = list(objects)
+    if not objects:
+        return []
+
+    keys = [f'course-outline:{kind}:{obj.pk}:{version_of(obj)}:{variant}' for obj in objects]
+
+    cache = outline_cache()
+    found = cache.get_many(keys)
+    missing = [(obj, key) for obj, key in zip(objects, keys) if key not in found]
+    if missing:
+        rendered = render([obj for obj, _ in missing])
+        fresh = {key: data for (_, key), data in zip(missing, rendered)}
+        cache.set_many(fresh)
+        found.update(fresh)
+    return [found[key] for key in keys]
@@ -0,0 +1,111 @@
+# courses/counters.py
+"""
+Denormalized counters on Course and Module.
+
+Course.module_count / chapter_count / content_count / enrolled_count /
+completed_count, Module.chapter_count / content_count and
+Enrollment.completed_modules are kept in step by the signals in
+courses/signals.py and by the bulk insert helpers, always with relative F()
+updates so concurrent writers never overwrite each other.
+
+Anything that bypasses both (raw SQL, queryset.update() on Enrollment.status,
+bulk deletes of unsaved objects...) can make them drift;
+`manage.py recompute_course_counters` rebuilds them from the source rows.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (
+    Course, Module, Chapter, ChapterContent, Enrollment, ModuleProgress,
+    count_subquery,
+)
+
+
+def _shift(queryset, **deltas):
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    return queryset.update(**{
+        # Clamp at zero: the columns are unsigned, and a counter that already
+        # drifted low must not make the delete that triggered this fail.
+        name: F(name) + delta if delta > 0 else Greatest(F(name) + delta, Value(0))
+        for name, delta in deltas.items()
+    })
+
+
+def shift_course_counts(course_id, **deltas):
+    """Add {counter: delta} to a course's counters in one UPDATE."""
+    return _shift(Course.objects.filter(pk=course_id), **deltas)
+
+
+def shift_module_counts(module_id, course_id, **deltas):
+    """Add {counter: delta} to a module and to the course that owns it."""
+    _shift(Module.objects.filter(pk=module_id), **deltas)
+    shift_course_counts(course_id, **deltas)
+
+
+def uncount_completed_modules(enrollments):
+    """Take one completed module off each of `enrollments` in one UPDATE."""
+    return _shift(enrollments, completed_modules=-1)
+
+
+def count_inserted(parents, counter):
+    """
+    Apply the counters for rows that were just bulk_create()d.
+
+    `parents` yields the Module of every inserted row; `counter` is
+    'chapter_count' or 'content_count'. One UPDATE per touched module and
+    per touched course.
+    """
+    modules = {}
+    per_module = Counter()
+    for module in parents:
+        modules[module.pk] = module
+        per_module[module.pk] += 1
+    per_course = Counter()
+    for module_id, count in per_module.items():
+        _shift(Module.objects.filter(pk=module_id), **{counter: count})
+        per_course[modules[module_id].course_id] += count
+    for course_id, count in per_course.items():
+        shift_course_counts(course_id, **{counter: count})
+
+
+def recompute_counters(course_ids=None):
+    """
+    Rebuild every counter from the source rows with correlated COUNT
+    subqueries: one UPDATE for modules, one for courses and one for
+    Enrollment.completed_modules. Limited to `course_ids` when given.
+    """
+    courses = Course.objects.all()
+    modules = Module.objects.all()
+    enrollments = Enrollment.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        modules = modules.filter(course_id__in=course_ids)
+        enrollments = enrollments.filter(course_id__in=course_ids)
+
+    modules.update(
+        chapter_count=count_subquery(Chapter, 'module'),
+        content_count=count_subquery(ChapterContent, 'chapter__module'),
+    )
+    completed = (
+        ModuleProgress.objects.filter(
+            user=OuterRef('user'),
+            module__course=OuterRef('course'),
+            progress__gte=100,
+        )
+        .order_by()
+        .values('user')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    enrollments.update(completed_modules=Coalesce(Subquery(completed), 0))
+    return courses.update(
+        module_count=count_subquery(Module, 'course'),
+        chapter_count=count_subquery(Chapter, 'module__course'),
+        content_count=count_subquery(ChapterContent, 'chapter__module__course'),
+        enrolled_count=count_subquery(Enrollment, 'course'),
+        completed_count=count_subquery(Enrollment, 'course', status='completed'),
+    )
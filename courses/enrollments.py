@@ -0,0 +1,67 @@
+# courses/enrollments.py
+"""
+Per-user cache of enrolled course IDs and enroll-on-first-access.
+
+The set of courses a user is enrolled in is read on almost every request
+(is_enrolled flags, auto-enrollment on module reads) but changes rarely, so it
+is cached per user and dropped by the Enrollment signals in courses/signals.py.
+The cache behind ENROLLMENT_CACHE has to be shared by every worker for those
+updates to reach them all.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Course, Enrollment
+
+ENROLLMENT_CACHE_ALIAS = getattr(settings, 'ENROLLMENT_CACHE', 'shared')
+ENROLLMENT_CACHE_TIMEOUT = getattr(settings, 'ENROLLMENT_CACHE_TIMEOUT', 300)
+
+
+def _cache_key(user_id):
+    return f'enrolled-courses:{user_id}'
+
+
+def enrolled_course_ids(user):
+    """
+    IDs of the courses the user is enrolled in (empty for anonymous users).
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    cache = caches[ENROLLMENT_CACHE_ALIAS]
+    course_ids = cache.get(_cache_key(user.pk))
+    if course_ids is None:
+        course_ids = frozenset(
+            Enrollment.objects.filter(user=user).values_list('course_id', flat=True)
+        )
+        cache.set(_cache_key(user.pk), course_ids, ENROLLMENT_CACHE_TIMEOUT)
+    return course_ids
+
+
+def invalidate_enrolled_course_ids(user_id):
+    caches[ENROLLMENT_CACHE_ALIAS].delete(_cache_key(user_id))
+
+
+def update_enrolled_course_ids(user_id, added=(), removed=()):
+    """
+    Patch a cached set in place rather than dropping it, so the next read
+    doesn't have to reload it. Nothing to do when the set isn't cached.
+    """
+    cache = caches[ENROLLMENT_CACHE_ALIAS]
+    course_ids = cache.get(_cache_key(user_id))
+    if course_ids is not None:
+        course_ids = (course_ids | frozenset(added)) - frozenset(removed)
+        cache.set(_cache_key(user_id), course_ids, ENROLLMENT_CACHE_TIMEOUT)
+
+
+def ensure_enrolled(user, course_id):
+    """
+    Enroll the user in the course unless they already are. Idempotent, and
+    free of queries once the user's enrolled courses are cached.
+    """
+    if course_id in enrolled_course_ids(user):
+        return False
+    if not Course.objects.filter(pk=course_id).exists():
+        return False
+    enrollment, created = Enrollment.enroll(user, course_id)
+    update_enrolled_course_ids(user.pk, added=[course_id])
+    return created
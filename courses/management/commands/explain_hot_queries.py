@@ -0,0 +1,151 @@
+# courses/management/commands/explain_hot_queries.py
+import math
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from Auths.models import CustomUser
+from courses.models import (
+    Course, Module, Chapter, Assignment, AssignmentSubmission, Enrollment, ModuleProgress,
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic catalogue (1M enrollments by default) inside a transaction, "
+        "print the query plans of the hot courses filters with and without the "
+        "composite indexes, then roll everything back."
+    )
+
+    # (model, index/constraint name) pairs dropped for the "without" run.
+    COMPOSITE_INDEXES = [
+        (Enrollment, 'enrollment_user_status_idx'),
+        (Enrollment, 'unique_enrollment_user_course'),
+        (ModuleProgress, 'progress_user_progress_idx'),
+        (Module, 'module_course_order_idx'),
+        (Chapter, 'chapter_module_order_idx'),
+        (AssignmentSubmission, 'submission_student_date_idx'),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enrollments', type=int, default=1_000_000)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--modules-per-course', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                sample = self.seed(options)
+                self.analyze()
+                self.explain_all("with composite indexes", sample)
+                self.drop_composite_indexes()
+                self.analyze()
+                self.explain_all("without composite indexes", sample)
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS("Rolled back all seeded rows and index changes."))
+
+    def seed(self, options):
+        batch = options['batch_size']
+        course_count = options['courses']
+        user_count = math.ceil(options['enrollments'] / course_count)
+        self.stdout.write(
+            f"Seeding {user_count} students x {course_count} courses "
+            f"= {user_count * course_count} enrollments..."
+        )
+
+        instructor = CustomUser.objects.create(
+            username='bench-instructor', email='bench-instructor@example.com',
+            role=CustomUser.Roles.INSTRUCTOR,
+        )
+        courses = Course.objects.bulk_create([
+            Course(title=f'Bench course {i}', description='', instructor=instructor)
+            for i in range(course_count)
+        ])
+        modules = Module.objects.bulk_create([
+            Module(course=course, title=f'Module {m}', description='', order=m)
+            for course in courses for m in range(options['modules_per_course'])
+        ])
+        Chapter.objects.bulk_create([
+            Chapter(module=module, title='Chapter', order=c)
+            for module in modules for c in range(3)
+        ], batch_size=batch)
+        assignment = Assignment.objects.create(module=modules[0], title='Bench', description='')
+
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench-{i}', email=f'bench-{i}@example.com')
+            for i in range(user_count)
+        ], batch_size=batch)
+
+        statuses = ('in-progress', 'completed')
+        pending = []
+        for i, user in enumerate(users):
+            for j, course in enumerate(courses):
+                pending.append(Enrollment(user=user, course=course, status=statuses[(i + j) % 2]))
+                if len(pending) >= batch:
+                    Enrollment.objects.bulk_create(pending)
+                    pending = []
+        Enrollment.objects.bulk_create(pending)
+
+        first_course_modules = modules[:options['modules_per_course']]
+        ModuleProgress.objects.bulk_create([
+            ModuleProgress(user=user, module=module, progress=100 if (i % 3) else 40)
+            for i, user in enumerate(users) for module in first_course_modules
+        ], batch_size=batch)
+        AssignmentSubmission.objects.bulk_create([
+            AssignmentSubmission(assignment=assignment, student=user, text='')
+            for user in users
+        ], batch_size=batch)
+
+        return {'user': users[len(users) // 2], 'course': courses[0], 'module': modules[0]}
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def drop_composite_indexes(self):
+        if connection.vendor == 'sqlite':
+            # Removing a table constraint would rebuild the table from the
+            # model state, which puts everything back; drop plain indexes only.
+            with connection.cursor() as cursor:
+                for model, name in self.COMPOSITE_INDEXES:
+                    if any(index.name == name for index in model._meta.indexes):
+                        cursor.execute(f'DROP INDEX "{name}"')
+                    else:
+                        self.stdout.write(f"(SQLite: keeping constraint {name})")
+            return
+
+        with connection.schema_editor() as editor:
+            for model, name in self.COMPOSITE_INDEXES:
+                for index in model._meta.indexes:
+                    if index.name == name:
+                        editor.remove_index(model, index)
+                for constraint in model._meta.constraints:
+                    if constraint.name == name:
+                        editor.remove_constraint(model, constraint)
+
+    def explain_all(self, title, sample):
+        user, course, module = sample['user'], sample['course'], sample['module']
+        queries = {
+            'Enrollment(user, status)':
+                Enrollment.objects.filter(user=user, status='completed'),
+            'Enrollment(user, course)':
+                Enrollment.objects.filter(user=user, course=course),
+            'ModuleProgress(user, module__course, progress)':
+                ModuleProgress.objects.filter(user=user, module__course=course, progress=100),
+            'Module(course, order)':
+                Module.objects.filter(course=course).order_by('order'),
+            'Chapter(module, order)':
+                Chapter.objects.filter(module=module).order_by('order'),
+            'AssignmentSubmission(student, submitted_at)':
+                AssignmentSubmission.objects.filter(student=user).order_by('-submitted_at'),
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {title} ==="))
+        for label, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_LABEL(f"\n{label}"))
+            self.stdout.write(queryset.explain())
@@ -0,0 +1,24 @@
+# courses/management/commands/recompute_course_counters.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.counters import recompute_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the denormalized Course/Module counters and "
+        "Enrollment.completed_modules from the source rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'course_ids', nargs='*', type=int,
+            help="Only recompute these courses (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        course_ids = options['course_ids'] or None
+        with transaction.atomic():
+            updated = recompute_counters(course_ids)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed counters for {updated} course(s)."))
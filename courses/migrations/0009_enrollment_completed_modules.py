@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_completed_modules(apps, schema_editor):
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    ModuleProgress = apps.get_model('courses', 'ModuleProgress')
+    completed = (
+        ModuleProgress.objects.filter(
+            user=OuterRef('user'),
+            module__course=OuterRef('course'),
+            progress__gte=100,
+        )
+        .order_by()
+        .values('user')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Enrollment.objects.update(completed_modules=Coalesce(Subquery(completed), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_chapter_chaptercontent_enrollment_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_modules',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_completed_modules, migrations.RunPython.noop),
+    ]
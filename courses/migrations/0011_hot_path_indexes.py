@@ -0,0 +1,62 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def remove_duplicate_enrollments(apps, schema_editor):
+    """
+    Keep the oldest enrollment per (user, course) so the unique constraint can
+    be added. It inherits the best progress of the duplicates it replaces.
+    """
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    duplicates = (
+        Enrollment.objects.values('user', 'course')
+        .annotate(rows=Count('id'), keep=Min('id'), best=Max('completed_modules'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        group = Enrollment.objects.filter(user=dup['user'], course=dup['course'])
+        completed = group.filter(status='completed').exists()
+        group.exclude(id=dup['keep']).delete()
+        updates = {'completed_modules': dup['best']}
+        if completed:
+            updates['status'] = 'completed'
+        Enrollment.objects.filter(id=dup['keep']).update(**updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['student', 'submitted_at'], name='submission_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['module', 'order'], name='chapter_module_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['user', 'status'], name='enrollment_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='module',
+            index=models.Index(fields=['course', 'order'], name='module_course_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moduleprogress',
+            index=models.Index(fields=['user', 'progress', 'module'], name='progress_user_progress_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='unique_enrollment_user_course'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, parent_lookup, **filters):
+    counted = (
+        model.objects.filter(**{parent_lookup: OuterRef('pk')}, **filters)
+        .order_by()
+        .values(parent_lookup)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Module = apps.get_model('courses', 'Module')
+    Chapter = apps.get_model('courses', 'Chapter')
+    ChapterContent = apps.get_model('courses', 'ChapterContent')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Module.objects.update(
+        chapter_count=count_subquery(Chapter, 'module'),
+        content_count=count_subquery(ChapterContent, 'chapter__module'),
+    )
+    Course.objects.update(
+        module_count=count_subquery(Module, 'course'),
+        chapter_count=count_subquery(Chapter, 'module__course'),
+        content_count=count_subquery(ChapterContent, 'chapter__module__course'),
+        enrolled_count=count_subquery(Enrollment, 'course'),
+        completed_count=count_subquery(Enrollment, 'course', status='completed'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='chapter_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='content_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrolled_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='module_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='chapter_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='content_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
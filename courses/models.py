@@ -1,7 +1,82 @@
 # courses/models.py
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
+
+def chapter_tree_prefetches(prefix='', depth=1):
+    """
+    Prefetch lookups for the ChapterContent level below a Chapter.
+    """
+    if depth < 1:
+        return []
+    return [
+        Prefetch(f'{prefix}contents', queryset=ChapterContent.objects.order_by('created_at', 'id')),
+    ]
+
+
+def module_tree_prefetches(prefix='', depth=2):
+    """
+    Prefetch lookups for the Chapter -> ChapterContent levels below a Module.
+    """
+    if depth < 1:
+        return []
+    return [
+        Prefetch(f'{prefix}chapters', queryset=Chapter.objects.order_by('order', 'id')),
+    ] + chapter_tree_prefetches(f'{prefix}chapters__', depth - 1)
+
+
+def course_tree_prefetches(depth=3):
+    """
+    Prefetch lookups for the Module -> Chapter -> ChapterContent levels below a Course.
+
+    Each level costs exactly one query however many courses are loaded, so the
+    whole tree comes back in (1 + depth) queries. The list can also be passed to
+    prefetch_related_objects() for courses that were already fetched.
+    """
+    if depth < 1:
+        return []
+    return [
+        Prefetch('modules', queryset=Module.objects.order_by('order', 'id')),
+    ] + module_tree_prefetches('modules__', depth - 1)
+
+
+def count_subquery(model, parent_lookup, **filters):
+    """
+    Correlated COUNT(*) of `model` rows belonging to the outer row.
+
+    Used instead of Count() over joins so module/chapter/content counts don't
+    multiply each other's rows.
+    """
+    counted = (
+        model.objects.filter(**{parent_lookup: OuterRef('pk')}, **filters)
+        .order_by()
+        .values(parent_lookup)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+class CourseQuerySet(models.QuerySet):
+    def with_tree(self, depth=3):
+        """Load the nested course tree in a fixed number of queries."""
+        return self.prefetch_related(*course_tree_prefetches(depth))
+
+
+class ModuleQuerySet(models.QuerySet):
+    def with_tree(self, depth=2):
+        """Load the nested module tree in a fixed number of queries."""
+        return self.prefetch_related(*module_tree_prefetches(depth=depth))
+
+
+class ChapterQuerySet(models.QuerySet):
+    def with_tree(self, depth=1):
+        """Load the chapter contents in a fixed number of queries."""
+        return self.prefetch_related(*chapter_tree_prefetches(depth=depth))
+
+
 class Course(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -12,6 +87,16 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, maintained by courses/counters.py and repaired by
+    # `manage.py recompute_course_counters`.
+    module_count = models.PositiveIntegerField(default=0, editable=False)
+    chapter_count = models.PositiveIntegerField(default=0, editable=False)
+    content_count = models.PositiveIntegerField(default=0, editable=False)
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CourseQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -21,6 +106,17 @@ class Module(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='modules')
     order = models.PositiveIntegerField(default=0)  # order of modules in the course
 
+    # Denormalized counters, see Course.
+    chapter_count = models.PositiveIntegerField(default=0, editable=False)
+    content_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ModuleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'order'], name='module_course_order_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.course.title}"
 
@@ -32,6 +128,13 @@ class Chapter(models.Model):
     title = models.CharField(max_length=255)
     order = models.PositiveIntegerField(default=0)  # order of chapters in the module
 
+    objects = ChapterQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['module', 'order'], name='chapter_module_order_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} (Module: {self.module.title})"
 
@@ -74,9 +177,14 @@ class AssignmentSubmission(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     file = models.FileField(upload_to='submissions/', null=True, blank=True)
     text = models.TextField(null=True, blank=True)
-    submitted_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(auto_now_add=True, db_index=True)
     grade = models.PositiveIntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'submitted_at'], name='submission_student_date_idx'),
+        ]
+
     def __str__(self):
         return f"Submission by {self.student.username} for {self.assignment.title}"
 
@@ -84,12 +192,50 @@ class AssignmentSubmission(models.Model):
 class Enrollment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
-    enrolled_at = models.DateTimeField(auto_now_add=True)
+    enrolled_at = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=20, default='in-progress')
+    # Number of the course's modules this user has at 100%, kept up to date by
+    # courses.progress so completion never needs a recount.
+    completed_modules = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the (user, course) lookups as an index.
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_enrollment_user_course'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'status'], name='enrollment_user_status_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} enrolled in {self.course.title}'
 
+    @classmethod
+    def enroll(cls, user, course_id):
+        """
+        get_or_create the enrollment; a new one starts with completed_modules
+        seeded from any progress the user already has in the course, and as
+        'completed' when that already covers every module.
+        """
+        seeded = {}
+
+        def completed_modules():
+            if 'count' not in seeded:
+                seeded['count'] = ModuleProgress.objects.filter(
+                    user=user, module__course_id=course_id, progress__gte=100
+                ).count()
+            return seeded['count']
+
+        def status():
+            total = Course.objects.filter(pk=course_id).values_list('module_count', flat=True).first()
+            return 'completed' if total and completed_modules() >= total else 'in-progress'
+
+        return cls.objects.get_or_create(
+            user=user,
+            course_id=course_id,
+            defaults={'status': status, 'completed_modules': completed_modules},
+        )
+
 
 class ModuleProgress(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='module_progresses')
@@ -99,6 +245,10 @@ class ModuleProgress(models.Model):
 
     class Meta:
         unique_together = ('user', 'module')
+        indexes = [
+            # Completed-module lookups: filter on (user, progress), join via module.
+            models.Index(fields=['user', 'progress', 'module'], name='progress_user_progress_idx'),
+        ]
         verbose_name = 'Module Progress'
         verbose_name_plural = 'Module Progresses'
 
@@ -0,0 +1,20 @@
+# courses/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class SubmissionCursorPagination(CursorPagination):
+    """
+    Newest submissions first. Pages seek on the indexed submitted_at column
+    instead of COUNT(*) + OFFSET, so deep pages cost the same as the first.
+    """
+    ordering = ('-submitted_at', '-id')
+
+
+class EnrollmentCursorPagination(CursorPagination):
+    ordering = ('-enrolled_at', '-id')
+
+
+class ModuleProgressCursorPagination(CursorPagination):
+    # last_updated moves on every write, which would shuffle rows between
+    # pages; the primary key follows creation order and never changes.
+    ordering = ('-id',)
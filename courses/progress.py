@@ -0,0 +1,237 @@
+# courses/progress.py
+"""
+Progress writes and incremental course completion.
+
+Enrollment.completed_modules counts the modules a user has at 100%. Every
+progress write compares the old and new value and, only when a module crosses
+the 100% threshold, shifts that counter with an F() expression. The
+enrollment flips to 'completed' once the counter reaches Course.module_count,
+and the course's completed_count moves with it.
+
+With settings.PROGRESS_WRITE_BEHIND enabled, heartbeats go through
+`progress_buffer` instead: they are coalesced in memory per (user, module)
+and written in bulk every PROGRESS_FLUSH_INTERVAL seconds or once
+PROGRESS_FLUSH_SIZE entries are pending, always from the buffer's timer
+thread (lms1/buffering.py) rather than the request that filled it. Buffered
+writes never lower a stored value, and a value of 100% is written straight
+away so completion is not held back by the buffer.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from lms1.buffering import WriteBehindBuffer
+
+from .counters import shift_course_counts
+from .models import Course, Enrollment, ModuleProgress
+from .signals import enrollment_completed, progress_recorded
+
+COMPLETE = 100
+
+
+def completion_delta(previous, current):
+    """+1 when a module reaches 100%, -1 when it drops below, else 0."""
+    return int(current >= COMPLETE) - int(previous >= COMPLETE)
+
+
+def module_totals(course_ids):
+    return dict(
+        Course.objects.filter(pk__in=course_ids).values_list('pk', 'module_count')
+    )
+
+
+def apply_completion_deltas(user, deltas):
+    """
+    Shift the user's completed_modules counters by {course_id: delta}, marking
+    enrollments that reach the course's module count as completed.
+    """
+    deltas = {course_id: delta for course_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    totals = module_totals(deltas)
+    for course_id, delta in deltas.items():
+        total = totals.get(course_id, 0)
+        enrollment = Enrollment.objects.filter(user=user, course_id=course_id)
+        if delta > 0 and total > 0:
+            # SET expressions see the pre-update row, hence `total - delta`.
+            # Flipping in a separate UPDATE tells us whether the course's
+            # completed_count has to move with it.
+            flipped = (
+                enrollment.filter(completed_modules__gte=total - delta)
+                .exclude(status='completed')
+                .update(completed_modules=F('completed_modules') + delta, status='completed')
+            )
+            if flipped:
+                shift_course_counts(course_id, completed_count=flipped)
+                enrollment_completed.send(
+                    sender=Enrollment, user_id=getattr(user, 'pk', user), course_id=course_id
+                )
+                continue
+        enrollment.update(completed_modules=F('completed_modules') + delta)
+
+
+def lock_enrollments(user_id, course_ids):
+    """
+    Lock the user's enrollments in `course_ids`. Every progress write takes
+    these before any ModuleProgress row, always in this order, so two writes
+    for the same user and course queue up instead of deadlocking. It also
+    covers progress rows that don't exist yet and so can't be locked
+    themselves: without it two concurrent writes could both read no
+    previous value and count the same completion twice.
+    """
+    list(
+        Enrollment.objects.select_for_update()
+        .filter(user_id=user_id, course_id__in=course_ids)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+
+@transaction.atomic
+def record_progress(user, module, value):
+    """
+    Upsert the user's progress on a module and keep completion in step.
+    Costs a constant number of queries whatever the size of the course.
+    """
+    lock_enrollments(user.pk, [module.course_id])
+    progress, created = ModuleProgress.objects.select_for_update().get_or_create(
+        user=user, module=module
+    )
+    previous = 0 if created else progress.progress
+    progress.progress = value
+    progress.save(update_fields=['progress', 'last_updated'])
+    apply_completion_deltas(user, {module.course_id: completion_delta(previous, value)})
+    progress_recorded.send(
+        sender=ModuleProgress, user_id=user.pk, course_ids=[module.course_id],
+        changes=[(module.pk, module.course_id, None if created else previous, value)],
+    )
+    return progress
+
+
+logger = logging.getLogger(__name__)
+
+
+@transaction.atomic
+def record_progress_batch(user, values, module_courses, monotonic=False):
+    """
+    Upsert many of the user's progress values at once.
+
+    `user` is a user or its pk, `values` maps module_id -> progress and
+    `module_courses` maps module_id -> course_id. All rows go out in a single
+    INSERT .. ON CONFLICT UPDATE, and completion is re-evaluated only for
+    courses where a module crossed 100%. With `monotonic`, stored values are
+    only ever raised.
+    """
+    user_id = getattr(user, 'pk', user)
+    lock_enrollments(user_id, {module_courses[module_id] for module_id in values})
+    previous = dict(
+        ModuleProgress.objects.select_for_update()
+        .filter(user_id=user_id, module_id__in=values)
+        .order_by('module_id')
+        .values_list('module_id', 'progress')
+    )
+    if monotonic:
+        values = {
+            module_id: value for module_id, value in values.items()
+            if value > previous.get(module_id, -1)
+        }
+    if not values:
+        return 0
+
+    now = timezone.now()
+    ModuleProgress.objects.bulk_create(
+        [
+            ModuleProgress(user_id=user_id, module_id=module_id, progress=value, last_updated=now)
+            for module_id, value in values.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'module'],
+        update_fields=['progress', 'last_updated'],
+    )
+
+    deltas = defaultdict(int)
+    for module_id, value in values.items():
+        deltas[module_courses[module_id]] += completion_delta(previous.get(module_id, 0), value)
+    apply_completion_deltas(user_id, deltas)
+    progress_recorded.send(
+        sender=ModuleProgress, user_id=user_id,
+        course_ids=sorted({module_courses[module_id] for module_id in values}),
+        changes=[
+            (module_id, module_courses[module_id], previous.get(module_id), value)
+            for module_id, value in values.items()
+        ],
+    )
+    return len(values)
+
+
+class ProgressBuffer(WriteBehindBuffer):
+    """
+    In-process write-behind buffer for progress heartbeats.
+
+    Pending values are max-merged per (user, module). A flush writes one
+    record_progress_batch() per user; if that fails the user's entries are
+    merged back for the next flush.
+    """
+    interval_setting = 'PROGRESS_FLUSH_INTERVAL'
+    default_interval = 5
+    size_setting = 'PROGRESS_FLUSH_SIZE'
+    default_size = 200
+
+    def add(self, user_id, values, module_courses):
+        """
+        Buffer {module_id: progress} for a user. Values at 100% are written
+        immediately; returns the number of rows written now.
+        """
+        urgent = {m: v for m, v in values.items() if v >= COMPLETE}
+        with self._lock:
+            for module_id, value in values.items():
+                if module_id not in urgent:
+                    key = (user_id, module_id)
+                    self._pending[key] = self.merge(self._pending.get(key), (value, module_courses[module_id]))
+
+        written = 0
+        if urgent:
+            written = record_progress_batch(user_id, urgent, module_courses, monotonic=True)
+            with self._lock:
+                for module_id in urgent:
+                    self._pending.pop((user_id, module_id), None)
+
+        self.flush_when_due()
+        return written
+
+    def merge(self, current, entry):
+        # (progress, course_id)
+        if current is None:
+            return entry
+        return max(entry[0], current[0]), entry[1]
+
+    def write(self, pending):
+        """Returns the number of rows written."""
+        by_user = defaultdict(dict)
+        module_courses = {}
+        for (user_id, module_id), (value, course_id) in pending.items():
+            by_user[user_id][module_id] = value
+            module_courses[module_id] = course_id
+
+        written = 0
+        for user_id, values in by_user.items():
+            try:
+                written += record_progress_batch(user_id, values, module_courses, monotonic=True)
+            except Exception:
+                logger.exception("Progress flush failed for user %s; re-queueing", user_id)
+                self.requeue({
+                    (user_id, module_id): (value, module_courses[module_id])
+                    for module_id, value in values.items()
+                })
+        return written
+
+
+progress_buffer = ProgressBuffer()
+
+
+def write_behind_enabled():
+    return getattr(settings, 'PROGRESS_WRITE_BEHIND', False)
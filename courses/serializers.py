@@ -1,11 +1,60 @@
 # courses/serializers.py
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 import json
+from .shaping import ShapedSerializerMixin
+from .progress import record_progress
+from .counters import count_inserted, shift_course_counts
 from .models import (
     Course, Module, Chapter, ChapterContent,
-    Assignment, AssignmentSubmission, Enrollment, ModuleProgress
+    Assignment, AssignmentSubmission, Enrollment, ModuleProgress,
+    course_tree_prefetches, module_tree_prefetches, chapter_tree_prefetches,
 )
 
+def tree_size(chapters_data):
+    """(chapters, contents) in a nested chapters payload."""
+    return len(chapters_data), sum(len(ch.get('contents', [])) for ch in chapters_data)
+
+
+def bulk_create_chapters(modules_with_chapters, count=True):
+    """
+    Create the chapters of several modules with one INSERT.
+
+    Takes [(module, chapters_data), ...], orders chapters by their position in
+    chapters_data and returns [(chapter, contents_data), ...] for the next level.
+    bulk_create() sends no signals, so the counters are shifted here unless
+    the caller already set them (`count=False`).
+    """
+    pending = []
+    for module, chapters_data in modules_with_chapters:
+        for index, ch_data in enumerate(chapters_data):
+            contents_data = ch_data.pop('contents', [])
+            chapter = Chapter(module=module, **{**ch_data, 'order': index})
+            pending.append((chapter, contents_data))
+    Chapter.objects.bulk_create([chapter for chapter, _ in pending])
+    if count:
+        count_inserted((chapter.module for chapter, _ in pending), 'chapter_count')
+    return pending
+
+
+def bulk_create_contents(chapters_with_contents, build=None, count=True):
+    """
+    Create the contents of several chapters with one INSERT.
+    `build(chapter, content_data)` returns the unsaved ChapterContent.
+    """
+    if build is None:
+        def build(chapter, content_data):
+            return ChapterContent(chapter=chapter, **content_data)
+    contents = ChapterContent.objects.bulk_create([
+        build(chapter, content_data)
+        for chapter, contents_data in chapters_with_contents
+        for content_data in contents_data
+    ])
+    if count:
+        count_inserted((content.chapter.module for content in contents), 'content_count')
+
+
 class ChapterContentSerializer(serializers.ModelSerializer):
     file = serializers.FileField(
         max_length=None,
@@ -35,18 +84,20 @@ class ChapterContentSerializer(serializers.ModelSerializer):
         return data
 
 
-class ChapterSerializer(serializers.ModelSerializer):
+class ChapterSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     contents = ChapterContentSerializer(many=True, required=False)
+    expandable_fields = ('contents',)
 
     class Meta:
         model = Chapter
         fields = ['id', 'title', 'order', 'contents']
 
+    @transaction.atomic
     def create(self, validated_data):
         contents_data = validated_data.pop('contents', [])
         chapter = Chapter.objects.create(**validated_data)
-        for content_data in contents_data:
-            ChapterContent.objects.create(chapter=chapter, **content_data)
+        bulk_create_contents([(chapter, contents_data)])
+        prefetch_related_objects([chapter], *chapter_tree_prefetches())
         return chapter
 
 
@@ -63,28 +114,32 @@ class AssignmentSerializer(serializers.ModelSerializer):
         fields = ['id', 'module', 'title', 'description', 'due_date', 'file', 'max_score']
 
 
-class ModuleSerializer(serializers.ModelSerializer):
+class ModuleSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     chapters = ChapterSerializer(many=True, required=False)
+    expandable_fields = ('chapters',)
 
     class Meta:
         model = Module
         fields = ['id', 'title', 'description', 'order', 'chapters', 'course']
         read_only_fields = ['order', 'course']
 
+    @transaction.atomic
     def create(self, validated_data):
         chapters_data = validated_data.pop('chapters', [])
-        module = Module.objects.create(**validated_data)
-        for index, ch_data in enumerate(chapters_data):
-            contents_data = ch_data.pop('contents', [])
-            ch = Chapter.objects.create(module=module, order=index, **ch_data)
-            for c_data in contents_data:
-                ChapterContent.objects.create(chapter=ch, **c_data)
+        chapter_count, content_count = tree_size(chapters_data)
+        module = Module.objects.create(
+            **validated_data, chapter_count=chapter_count, content_count=content_count
+        )
+        shift_course_counts(module.course_id, chapter_count=chapter_count, content_count=content_count)
+        bulk_create_contents(bulk_create_chapters([(module, chapters_data)], count=False), count=False)
+        prefetch_related_objects([module], *module_tree_prefetches())
         return module
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, required=False)
     is_enrolled = serializers.SerializerMethodField()
+    expandable_fields = ('modules',)
 
     class Meta:
         model = Course
@@ -98,9 +153,17 @@ class CourseSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
+        enrolled_ids = self.context.get('enrolled_course_ids')
+        if enrolled_ids is not None:
+            return obj.id in enrolled_ids
         return Enrollment.objects.filter(user=user, course=obj).exists()
 
+    @transaction.atomic
     def create(self, validated_data):
+        """
+        Create the course and its whole tree in one transaction, one INSERT
+        per level. Content files are bound through each item's `fileFieldKey`.
+        """
         request = self.context.get('request')
         modules_data_str = request.data.get('modules', None)
         if modules_data_str:
@@ -111,33 +174,65 @@ class CourseSerializer(serializers.ModelSerializer):
         else:
             modules_data = []
 
-        course = Course.objects.create(**validated_data)
-
-        # Create modules in the order
+        # Create modules in the order; the whole tree is new, so every
+        # counter is known before the first INSERT.
+        course = Course(**validated_data, module_count=len(modules_data))
+        modules_with_chapters = []
         for index, mod_data in enumerate(modules_data):
             chapters_data = mod_data.pop('chapters', [])
-            module = Module.objects.create(course=course, order=index, **mod_data)
-            for ch_index, ch_data in enumerate(chapters_data):
-                contents_data = ch_data.pop('contents', [])
-                chapter = Chapter.objects.create(module=module, order=ch_index, **ch_data)
-                for cnt_data in contents_data:
-                    file_field_key = cnt_data.get('fileFieldKey')
-                    uploaded_file = None
-                    if file_field_key and file_field_key in request.FILES:
-                        uploaded_file = request.FILES[file_field_key]
-
-                    ChapterContent.objects.create(
-                        chapter=chapter,
-                        content_type=cnt_data.get('content_type'),
-                        content_title=cnt_data.get('content_title'),
-                        text=cnt_data.get('text',''),
-                        file=uploaded_file,
-                        video_url=cnt_data.get('video_url') or cnt_data.get('link',''),
-                    )
-
+            chapter_count, content_count = tree_size(chapters_data)
+            module = Module(**{
+                **mod_data, 'course': course, 'order': index,
+                'chapter_count': chapter_count, 'content_count': content_count,
+            })
+            course.chapter_count += chapter_count
+            course.content_count += content_count
+            modules_with_chapters.append((module, chapters_data))
+        course.save()
+        Module.objects.bulk_create([module for module, _ in modules_with_chapters])
+
+        def build_content(chapter, cnt_data):
+            file_field_key = cnt_data.get('fileFieldKey')
+            uploaded_file = None
+            if file_field_key and file_field_key in request.FILES:
+                uploaded_file = request.FILES[file_field_key]
+
+            return ChapterContent(
+                chapter=chapter,
+                content_type=cnt_data.get('content_type'),
+                content_title=cnt_data.get('content_title'),
+                text=cnt_data.get('text',''),
+                file=uploaded_file,
+                video_url=cnt_data.get('video_url') or cnt_data.get('link',''),
+            )
+
+        bulk_create_contents(
+            bulk_create_chapters(modules_with_chapters, count=False), build_content, count=False
+        )
+        # Render the response from one query per level as well
+        prefetch_related_objects([course], *course_tree_prefetches())
         return course
 
 
+class CourseSummarySerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    """
+    Catalogue card representation: no nested tree, only its sizes, read
+    from the denormalized counters on Course.
+    """
+    is_enrolled = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'description', 'cover_image', 'instructor', 'created_at',
+            'module_count', 'chapter_count', 'content_count',
+            'enrolled_count', 'completed_count', 'is_enrolled',
+        ]
+        read_only_fields = fields
+
+    get_is_enrolled = CourseSerializer.get_is_enrolled
+
+
 class AssignmentSubmissionSerializer(serializers.ModelSerializer):
     file = serializers.FileField(
         max_length=None, 
@@ -167,11 +262,7 @@ class EnrollmentSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user = self.context['request'].user
         course = validated_data['course']
-        enrollment, created = Enrollment.objects.get_or_create(
-            user=user,
-            course=course,
-            defaults={'status': 'in-progress'}
-        )
+        enrollment, created = Enrollment.enroll(user, course.id)
         return enrollment
 
 
@@ -192,14 +283,48 @@ class ModuleProgressSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user = self.context['request'].user
         module = validated_data['module']
-        progress, created = ModuleProgress.objects.get_or_create(
-            user=user, module=module
-        )
-        progress.progress = validated_data.get('progress', progress.progress)
-        progress.save()
-        return progress
+        if 'progress' not in validated_data:
+            progress, created = ModuleProgress.objects.get_or_create(user=user, module=module)
+            return progress
+        return record_progress(user, module, validated_data['progress'])
 
     def update(self, instance, validated_data):
-        instance.progress = validated_data.get('progress', instance.progress)
-        instance.save()
-        return instance
+        return record_progress(
+            instance.user,
+            instance.module,
+            validated_data.get('progress', instance.progress),
+        )
+
+
+class ProgressUpdateSerializer(serializers.Serializer):
+    module = serializers.IntegerField()
+    progress = serializers.IntegerField(min_value=0, max_value=100)
+
+
+class ModuleProgressBatchSerializer(serializers.Serializer):
+    """
+    Body of POST /courses/progress/batch/:
+        { "updates": [ {"module": 1, "progress": 40}, ... ] }
+
+    Repeated modules collapse to their highest value.
+    """
+    MAX_UPDATES = 500
+
+    updates = ProgressUpdateSerializer(many=True, allow_empty=False, max_length=MAX_UPDATES)
+
+    def validate(self, data):
+        values = {}
+        for update in data['updates']:
+            module_id = update['module']
+            values[module_id] = max(update['progress'], values.get(module_id, 0))
+
+        module_courses = dict(
+            Module.objects.filter(id__in=values).values_list('id', 'course_id')
+        )
+        unknown = sorted(set(values) - set(module_courses))
+        if unknown:
+            raise serializers.ValidationError({"updates": f"Unknown module ids: {unknown}"})
+
+        data['values'] = values
+        data['module_courses'] = module_courses
+        return data
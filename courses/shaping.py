@@ -0,0 +1,100 @@
+# courses/shaping.py
+"""
+Sparse fieldsets and expansion control for the nested course serializers.
+
+    ?fields=id,title,modules    keep only these top-level fields
+    ?expand=modules.chapters    render only these nested arrays
+
+Without ?expand every nested array is rendered, as before. Both parameters
+are only honoured on safe (read) requests.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _split(value):
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+def requested_shape(request):
+    """
+    Return (fields, expand) for the request; either is None when not restricted.
+    Every dotted expand path also expands its ancestors.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    params = getattr(request, 'query_params', request.GET)
+
+    fields = _split(params.get('fields', '')) or None
+
+    expand = None
+    if 'expand' in params:
+        expand = set()
+        for path in _split(params.get('expand', '')):
+            parts = path.split('.')
+            for i in range(1, len(parts) + 1):
+                expand.add('.'.join(parts[:i]))
+    return fields, expand
+
+
+class ShapedSerializerMixin:
+    """
+    Drops fields that the request did not ask for.
+
+    `expandable_fields` names the nested serializer fields; they are kept only
+    when their dotted path (from the root serializer) is in ?expand.
+    """
+    expandable_fields = ()
+
+    def _shape_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return list(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = requested_shape(self.context.get('request'))
+        path = self._shape_path()
+
+        if requested is not None and not path:
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+
+        if expand is not None:
+            for name in self.expandable_fields:
+                if '.'.join(path + [name]) not in expand:
+                    fields.pop(name, None)
+        return fields
+
+
+class ShapedViewMixin:
+    """
+    Works out how deep the nested tree has to be prefetched for the requested
+    shape, so unrequested levels are never loaded from the database.
+
+    `tree_levels` lists the nested fields from the root down,
+    e.g. ('modules', 'chapters', 'contents').
+    """
+    tree_levels = ()
+
+    def get_tree_depth(self):
+        if not self.tree_levels:
+            return 0
+        fields, expand = requested_shape(self.request)
+        if fields is not None and self.tree_levels[0] not in fields:
+            return 0
+        if expand is None:
+            return len(self.tree_levels)
+
+        depth = 0
+        path = []
+        for level in self.tree_levels:
+            path.append(level)
+            if '.'.join(path) not in expand:
+                break
+            depth += 1
+        return depth
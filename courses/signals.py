@@ -0,0 +1,280 @@
+# courses/signals.py
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .counters import shift_course_counts, shift_module_counts, uncount_completed_modules
+from .enrollments import update_enrolled_course_ids
+from .models import Course, Module, Chapter, ChapterContent, Enrollment, ModuleProgress
+
+# Sent after progress rows are written: user_id, course_ids and changes, a
+# list of (module_id, course_id, previous, current) where previous is None
+# for rows that did not exist before.
+progress_recorded = Signal()
+
+# Sent when an enrollment turns 'completed', including flips done with
+# queryset.update() in courses/progress.py: user_id, course_id.
+enrollment_completed = Signal()
+
+
+def deleted_with(origin, *models):
+    """
+    Whether a delete signal is part of the cascade started by a row or
+    queryset of one of `models`; `origin` is the signal's argument.
+    """
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+# key -> token of the on_commit_once() callbacks not yet run, per thread
+# (each thread has its own connections, and callbacks run in the thread
+# that commits).
+_pending_once = threading.local()
+
+
+def on_commit_once(key, func):
+    """
+    transaction.on_commit(func), run once per commit however many times the
+    same key is registered in the transaction. Handlers that fire for every
+    row of a bulk or cascading change then act once per transaction.
+
+    Every registration adds a callback sharing the key's pending token; the
+    first one to run takes the token and calls func(), the others find it
+    gone. A token left over from a rolled back transaction is simply reused.
+    """
+    if not hasattr(_pending_once, 'tokens'):
+        _pending_once.tokens = {}
+    pending = _pending_once.tokens
+    token = pending.setdefault(key, object())
+
+    def callback():
+        if pending.get(key) is token:
+            del pending[key]
+            func()
+
+    transaction.on_commit(callback)
+
+
+def course_id_for(instance):
+    """
+    Course that owns a Course/Module/Chapter/ChapterContent, or None if the
+    parent rows are already gone.
+    """
+    if isinstance(instance, Course):
+        return instance.pk
+    if isinstance(instance, Module):
+        return instance.course_id
+    if isinstance(instance, Chapter):
+        return Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    return (
+        Chapter.objects.filter(pk=instance.chapter_id)
+        .values_list('module__course_id', flat=True)
+        .first()
+    )
+
+
+# Rows whose cascading delete takes each outline model with it.
+OUTLINE_PARENTS = {
+    Module: (Course,),
+    Chapter: (Course, Module),
+    ChapterContent: (Course, Module, Chapter),
+}
+
+
+def touch_course(course_id):
+    # Course.updated_at is the content version and Last-Modified of the
+    # course and module outlines (courses/caching.py).
+    Course.objects.filter(pk=course_id).update(updated_at=timezone.now())
+
+
+# Course.save() sets updated_at itself.
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+@receiver(post_save, sender=ChapterContent)
+@receiver(post_delete, sender=ChapterContent)
+def invalidate_course_outline(sender, instance, origin=None, **kwargs):
+    # The parent whose delete cascaded here invalidates the outline itself.
+    if deleted_with(origin, *OUTLINE_PARENTS[sender]):
+        return
+    course_id = course_id_for(instance)
+    if course_id is not None:
+        on_commit_once(('course-outline', course_id), lambda: touch_course(course_id))
+
+
+@receiver(post_save, sender=Enrollment)
+def add_enrolled_course(sender, instance, created, **kwargs):
+    if created:
+        user_id, course_id = instance.user_id, instance.course_id
+        transaction.on_commit(lambda: update_enrolled_course_ids(user_id, added=[course_id]))
+
+
+@receiver(post_delete, sender=Enrollment)
+def remove_enrolled_course(sender, instance, **kwargs):
+    user_id, course_id = instance.user_id, instance.course_id
+    transaction.on_commit(lambda: update_enrolled_course_ids(user_id, removed=[course_id]))
+
+
+# Denormalized counters (courses/counters.py). A row that is saved or deleted
+# on its own shifts its parents' counters. In a cascade only the row the
+# delete started from does: it takes its whole subtree's counts out at once
+# (read in pre_delete, before the children go), and the children return
+# early instead of each doing a lookup and an UPDATE.
+
+def tree_delta(signal, created):
+    """+1 for an insert, -1 for a delete, 0 for an update."""
+    return -1 if signal is post_delete else int(created)
+
+
+@receiver(pre_delete, sender=Module)
+def remember_module_counts(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Course):
+        instance._stored_counts = (
+            Module.objects.filter(pk=instance.pk).values('chapter_count', 'content_count').first()
+        )
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def count_module(sender, instance, signal, created=False, origin=None, **kwargs):
+    if signal is post_save:
+        shift_course_counts(instance.course_id, module_count=int(created))
+        return
+    if deleted_with(origin, Course):
+        return
+    stored = getattr(instance, '_stored_counts', None) or {}
+    shift_course_counts(
+        instance.course_id,
+        module_count=-1,
+        chapter_count=-stored.get('chapter_count', 0),
+        content_count=-stored.get('content_count', 0),
+    )
+
+
+@receiver(pre_delete, sender=Chapter)
+def remember_chapter_contents(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Course, Module):
+        instance._stored_content_count = ChapterContent.objects.filter(chapter=instance).count()
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+def count_chapter(sender, instance, signal, created=False, origin=None, **kwargs):
+    delta = tree_delta(signal, created)
+    if not delta or deleted_with(origin, Course, Module):
+        return
+    course_id = course_id_for(instance)
+    if course_id is not None:
+        shift_module_counts(
+            instance.module_id, course_id,
+            chapter_count=delta,
+            content_count=-getattr(instance, '_stored_content_count', 0) if delta < 0 else 0,
+        )
+
+
+@receiver(post_save, sender=ChapterContent)
+@receiver(post_delete, sender=ChapterContent)
+def count_content(sender, instance, signal, created=False, origin=None, **kwargs):
+    delta = tree_delta(signal, created)
+    if not delta or deleted_with(origin, Course, Module, Chapter):
+        return
+    parents = (
+        Chapter.objects.filter(pk=instance.chapter_id)
+        .values_list('module_id', 'module__course_id')
+        .first()
+    )
+    if parents is not None:
+        shift_module_counts(*parents, content_count=delta)
+
+
+# Enrollment.completed_modules goes up as modules reach 100% (courses/progress.py)
+# and has to come down when a completed module or its progress row goes, or
+# the counter catches up with a module count that has shrunk. Deleting a
+# module does it in pre_delete, while its progress rows still exist, with one
+# UPDATE for every enrollment that had it complete. Progress rows are handled
+# in pre_delete too, so the enrollment is locked before the row, in the same
+# order as progress writes take them (courses/progress.py lock_enrollments).
+
+@receiver(pre_delete, sender=Module)
+def uncount_completed_module(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, Course):
+        return
+    completed = ModuleProgress.objects.filter(module=instance, progress__gte=100)
+    uncount_completed_modules(
+        Enrollment.objects.filter(course_id=instance.course_id, user__in=completed.values('user'))
+    )
+
+
+@receiver(post_delete, sender=Module)
+def complete_finished_enrollments(sender, instance, origin=None, **kwargs):
+    # Connected after count_module, so module_count is already lowered: losing
+    # the one module a student hadn't finished completes the course for them.
+    if deleted_with(origin, Course):
+        return
+    total = Course.objects.filter(pk=instance.course_id).values_list('module_count', flat=True).first()
+    if not total:
+        return
+    finished = (
+        Enrollment.objects.filter(course_id=instance.course_id, completed_modules__gte=total)
+        .exclude(status='completed')
+    )
+    user_ids = list(finished.values_list('user_id', flat=True))
+    if not user_ids:
+        return
+    flipped = finished.filter(user_id__in=user_ids).update(status='completed')
+    shift_course_counts(instance.course_id, completed_count=flipped)
+    for user_id in user_ids:
+        enrollment_completed.send(sender=Enrollment, user_id=user_id, course_id=instance.course_id)
+
+
+@receiver(pre_delete, sender=ModuleProgress)
+def uncount_completed_progress(sender, instance, origin=None, **kwargs):
+    if instance.progress < 100 or deleted_with(origin, Course, Module, get_user_model()):
+        return
+    uncount_completed_modules(
+        Enrollment.objects.filter(user_id=instance.user_id, course__modules=instance.module_id)
+    )
+
+
+@receiver(pre_save, sender=Enrollment)
+def remember_enrollment_status(sender, instance, raw=False, **kwargs):
+    instance._stored_status = None
+    if instance.pk is not None and not raw:
+        instance._stored_status = (
+            Enrollment.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    completed = instance.status == 'completed'
+    if created:
+        shift_course_counts(instance.course_id, enrolled_count=1, completed_count=int(completed))
+        if completed:
+            enrollment_completed.send(sender=Enrollment, user_id=instance.user_id, course_id=instance.course_id)
+        return
+    was_completed = getattr(instance, '_stored_status', None) == 'completed'
+    shift_course_counts(instance.course_id, completed_count=int(completed) - int(was_completed))
+    if completed and not was_completed:
+        enrollment_completed.send(sender=Enrollment, user_id=instance.user_id, course_id=instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, Course):
+        return
+    shift_course_counts(
+        instance.course_id,
+        enrolled_count=-1,
+        completed_count=-int(instance.status == 'completed'),
+    )
@@ -1,3 +1,835 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from Auths.models import CustomUser
+from .models import Course, Module, Chapter, ChapterContent, Enrollment, ModuleProgress
+from .serializers import CourseSerializer, ModuleSerializer
+from .caching import outline_cache
+from .progress import ProgressBuffer, progress_buffer, record_progress
+from .enrollments import ENROLLMENT_CACHE_ALIAS, invalidate_enrolled_course_ids
+from .counters import recompute_counters
+from .signals import on_commit_once
+
+
+def build_catalogue(instructor, course_count, modules=2, chapters=2, contents=2):
+    """
+    Bulk-create `course_count` courses, each with a full module/chapter/content tree.
+    """
+    courses = Course.objects.bulk_create([
+        Course(title=f"Course {i}", description="desc", instructor=instructor)
+        for i in range(course_count)
+    ])
+    module_objs = Module.objects.bulk_create([
+        Module(course=course, title=f"Module {m}", description="desc", order=modules - m)
+        for course in courses for m in range(modules)
+    ])
+    chapter_objs = Chapter.objects.bulk_create([
+        Chapter(module=module, title=f"Chapter {c}", order=chapters - c)
+        for module in module_objs for c in range(chapters)
+    ])
+    ChapterContent.objects.bulk_create([
+        ChapterContent(chapter=chapter, content_type='text', content_title=f"Content {t}", text="body")
+        for chapter in chapter_objs for t in range(contents)
+    ])
+    # bulk_create() bypasses the counter signals
+    recompute_counters([course.pk for course in courses])
+    return courses
+
+
+class CoursesTestCase(TestCase):
+    def setUp(self):
+        outline_cache().clear()
+        caches['default'].clear()
+        caches[ENROLLMENT_CACHE_ALIAS].clear()
+        self.instructor = CustomUser.objects.create_user(
+            username="instructor", email="instructor@example.com", password="pass",
+            first_name="In", last_name="Structor", role=CustomUser.Roles.INSTRUCTOR,
+        )
+
+
+class StudentTestCase(CoursesTestCase):
+    """Adds a student and an API client logged in as them."""
+
+    def setUp(self):
+        super().setUp()
+        self.student = CustomUser.objects.create_user(
+            username="student", email="student@example.com", password="pass",
+            first_name="Stu", last_name="Dent", role=CustomUser.Roles.STUDENT,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+
+class CourseTreeLoadingTests(CoursesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = APIRequestFactory().get('/courses/courses/')
+        self.request.user = AnonymousUser()
+
+    def serialize_all(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = CourseSerializer(
+                Course.objects.with_tree().select_related('instructor').order_by('id'),
+                many=True,
+                context={'request': self.request},
+            ).data
+        return data, len(ctx.captured_queries)
+
+    def test_query_count_is_flat_from_1_to_500_courses(self):
+        build_catalogue(self.instructor, 1)
+        data, small_queries = self.serialize_all()
+        self.assertEqual(len(data), 1)
+
+        build_catalogue(self.instructor, 499)
+        data, large_queries = self.serialize_all()
+        self.assertEqual(len(data), 500)
+
+        # courses + modules + chapters + contents
+        self.assertEqual(small_queries, 4)
+        self.assertEqual(large_queries, small_queries)
+
+    def test_tree_is_ordered_by_order(self):
+        build_catalogue(self.instructor, 1, modules=3, chapters=3)
+        data, _ = self.serialize_all()
+        module_orders = [m['order'] for m in data[0]['modules']]
+        self.assertEqual(module_orders, sorted(module_orders))
+        chapter_orders = [c['order'] for c in data[0]['modules'][0]['chapters']]
+        self.assertEqual(chapter_orders, sorted(chapter_orders))
+
+    def test_list_endpoint_query_count_does_not_grow(self):
+        client = APIClient()
+        build_catalogue(self.instructor, 1)
+        with CaptureQueriesContext(connection) as small:
+            client.get('/courses/courses/', secure=True)
+        build_catalogue(self.instructor, 40)
+        with CaptureQueriesContext(connection) as large:
+            response = client.get('/courses/courses/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+class EnrolledFlagTests(StudentTestCase):
+    def list_courses(self, path='/courses/courses/'):
+        invalidate_enrolled_course_ids(self.student.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_is_enrolled_resolved_once_per_request(self):
+        courses = build_catalogue(self.instructor, 2)
+        Enrollment.objects.create(user=self.student, course=courses[0])
+        response, small_queries = self.list_courses()
+        flags = {c['id']: c['is_enrolled'] for c in response.data['results']}
+        self.assertEqual(flags, {courses[0].id: True, courses[1].id: False})
+
+        more = build_catalogue(self.instructor, 10)
+        Enrollment.objects.bulk_create([Enrollment(user=self.student, course=c) for c in more])
+        _, large_queries = self.list_courses()
+        self.assertEqual(large_queries, small_queries)
+
+    def test_in_progress_courses_are_flagged_enrolled(self):
+        courses = build_catalogue(self.instructor, 3)
+        Enrollment.objects.bulk_create([Enrollment(user=self.student, course=c) for c in courses])
+        response, _ = self.list_courses('/courses/courses/in_progress_courses/')
+        self.assertEqual(len(response.data), 3)
+        self.assertTrue(all(c['is_enrolled'] for c in response.data))
+
+
+class CourseSummaryViewTests(CoursesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_summary_returns_counts_without_tree(self):
+        build_catalogue(self.instructor, 2, modules=3, chapters=2, contents=4)
+        response = self.client.get('/courses/courses/?view=summary', secure=True)
+        self.assertEqual(response.status_code, 200)
+        card = response.data['results'][0]
+        self.assertNotIn('modules', card)
+        self.assertEqual(
+            (card['module_count'], card['chapter_count'], card['content_count']),
+            (3, 6, 24),
+        )
+
+    def test_summary_counts_course_without_modules_as_zero(self):
+        Course.objects.create(title="Empty", description="desc", instructor=self.instructor)
+        response = self.client.get('/courses/courses/?view=summary', secure=True)
+        card = response.data['results'][0]
+        self.assertEqual(
+            (card['module_count'], card['chapter_count'], card['content_count']),
+            (0, 0, 0),
+        )
+
+    def test_summary_uses_two_queries(self):
+        build_catalogue(self.instructor, 25)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/courses/courses/?view=summary', secure=True)
+        # pagination COUNT + page
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+
+class SparseFieldsetTests(CoursesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        build_catalogue(self.instructor, 3)
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_fields_drops_tree_and_its_queries(self):
+        data, queries = self.get('/courses/courses/?fields=id,title')
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+        # pagination COUNT + page + cache-miss reload, no prefetches
+        self.assertEqual(queries, 3)
+
+    def test_expand_limits_nesting_depth(self):
+        data, queries = self.get('/courses/courses/?expand=modules')
+        module = data['results'][0]['modules'][0]
+        self.assertNotIn('chapters', module)
+        self.assertEqual(queries, 4)
+
+        data, queries = self.get('/courses/courses/?expand=modules.chapters')
+        chapter = data['results'][0]['modules'][0]['chapters'][0]
+        self.assertNotIn('contents', chapter)
+        self.assertEqual(queries, 5)
+
+    def test_empty_expand_renders_no_nested_arrays(self):
+        data, queries = self.get('/courses/courses/?expand=')
+        self.assertNotIn('modules', data['results'][0])
+        self.assertEqual(queries, 3)
+
+    def test_default_shape_is_unchanged(self):
+        data, _ = self.get('/courses/courses/')
+        contents = data['results'][0]['modules'][0]['chapters'][0]['contents']
+        self.assertEqual(len(contents), 2)
+
+
+class OutlineCacheTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = build_catalogue(self.instructor, 1)[0]
+
+    def get(self, path, user=None):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_warm_cache_skips_tree_queries(self):
+        path = f'/courses/courses/{self.course.id}/'
+        cold, cold_queries = self.get(path)
+        warm, warm_queries = self.get(path)
+        self.assertEqual(warm, cold)
+        # course row only
+        self.assertEqual(warm_queries, 1)
+        self.assertLess(warm_queries, cold_queries)
+
+    def test_content_edit_invalidates_outline(self):
+        path = f'/courses/courses/{self.course.id}/'
+        self.get(path)
+        content = ChapterContent.objects.filter(chapter__module__course=self.course).first()
+        content.content_title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            content.save()
+        data, _ = self.get(path)
+        titles = [
+            c['content_title']
+            for m in data['modules'] for ch in m['chapters'] for c in ch['contents']
+        ]
+        self.assertIn("Renamed", titles)
+
+    def test_module_delete_invalidates_outline(self):
+        path = f'/courses/courses/{self.course.id}/'
+        data, _ = self.get(path)
+        self.assertEqual(len(data['modules']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Module.objects.filter(course=self.course).first().delete()
+        data, _ = self.get(path)
+        self.assertEqual(len(data['modules']), 1)
+
+    def test_cascades_touch_the_course_once(self):
+        def course_touches():
+            return [
+                q for q in ctx.captured_queries
+                if q['sql'].startswith('UPDATE "courses_course" SET "updated_at"')
+            ]
+        module = Module.objects.filter(course=self.course).first()
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            module.delete()
+        self.assertEqual(len(course_touches()), 1)
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertEqual(course_touches(), [])
+
+    def test_on_commit_once_runs_once_and_survives_a_rollback(self):
+        calls = []
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                on_commit_once('key', lambda: calls.append('rolled back'))
+                raise ValueError
+            for n in range(3):
+                on_commit_once('key', lambda n=n: calls.append(n))
+        self.assertEqual(calls, [0])
+
+    def test_is_enrolled_is_not_shared_through_the_cache(self):
+        path = f'/courses/courses/{self.course.id}/'
+        Enrollment.objects.create(user=self.student, course=self.course)
+        data, _ = self.get(path, user=self.student)
+        self.assertTrue(data['is_enrolled'])
+        data, _ = self.get(path, user=self.instructor)
+        self.assertFalse(data['is_enrolled'])
+
+    def test_module_detail_is_cached_per_course_version(self):
+        module = Module.objects.filter(course=self.course).first()
+        path = f'/courses/courses/{self.course.id}/modules/{module.id}/'
+        cold, _ = self.get(path, user=self.instructor)
+        warm, _ = self.get(path, user=self.instructor)
+        self.assertEqual(warm, cold)
+        Chapter.objects.filter(module=module).update(title="stale")  # no signal, still cached
+        data, _ = self.get(path, user=self.instructor)
+        self.assertEqual(data, cold)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+        data, _ = self.get(path, user=self.instructor)
+        self.assertEqual({c['title'] for c in data['chapters']}, {"stale"})
+
+
+class ConditionalGetTests(CoursesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+        self.course = build_catalogue(self.instructor, 1)[0]
+        self.module = Module.objects.filter(course=self.course).first()
+
+    def assert_revalidates(self, path):
+        first = self.client.get(path, secure=True)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', first)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(path, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertFalse(any('courses_chapter' in q['sql'] for q in ctx.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Chapter.objects.create(module=self.module, title="New chapter", order=9)
+        third = self.client.get(path, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+    def test_course_retrieve(self):
+        self.assert_revalidates(f'/courses/courses/{self.course.id}/')
+
+    def test_module_retrieve(self):
+        self.assert_revalidates(f'/courses/courses/{self.course.id}/modules/{self.module.id}/')
+
+    def test_module_detailed_view(self):
+        self.assert_revalidates(
+            f'/courses/courses/{self.course.id}/modules/{self.module.id}/detailed_view/'
+        )
+
+    def test_child_change_moves_last_modified(self):
+        before = Course.objects.get(pk=self.course.pk).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            ChapterContent.objects.filter(chapter__module=self.module).first().save()
+        self.assertGreater(Course.objects.get(pk=self.course.pk).updated_at, before)
+
+    def test_version_follows_the_database_not_the_cache(self):
+        # A write in another worker moves updated_at but never reaches this
+        # worker's cache; the stale blob and ETag must still be retired.
+        path = f'/courses/courses/{self.course.id}/'
+        first = self.client.get(path, secure=True)
+        Chapter.objects.filter(module=self.module).update(title="Elsewhere")
+        Course.objects.filter(pk=self.course.pk).update(updated_at=timezone.now())
+        second = self.client.get(path, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertIn("Elsewhere", [c['title'] for m in second.data['modules'] for c in m['chapters']])
+
+
+class NestedCreateTests(CoursesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def modules_payload(self, modules, chapters, contents):
+        return json.dumps([
+            {
+                'title': f'Module {m}', 'description': 'desc',
+                'chapters': [
+                    {
+                        'title': f'Chapter {m}.{c}',
+                        'contents': [
+                            {'content_type': 'text', 'content_title': f'Text {t}', 'text': 'body'}
+                            for t in range(contents)
+                        ],
+                    }
+                    for c in range(chapters)
+                ],
+            }
+            for m in range(modules)
+        ])
+
+    def post_course(self, modules_json, **files):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                '/courses/courses/',
+                {'title': 'Imported', 'description': 'desc', 'modules': modules_json, **files},
+                format='multipart', secure=True,
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "courses_')]
+        return response, len(inserts)
+
+    def test_nested_create_uses_one_insert_per_level(self):
+        _, small_inserts = self.post_course(self.modules_payload(1, 1, 1))
+        response, large_inserts = self.post_course(self.modules_payload(6, 5, 4))
+        self.assertEqual(small_inserts, 4)
+        self.assertEqual(large_inserts, 4)
+
+        course = Course.objects.get(pk=response.data['id'])
+        self.assertEqual(ChapterContent.objects.filter(chapter__module__course=course).count(), 120)
+        self.assertEqual(
+            list(course.modules.order_by('order').values_list('title', flat=True)),
+            [f'Module {m}' for m in range(6)],
+        )
+        self.assertEqual(
+            list(course.modules.get(order=2).chapters.order_by('order').values_list('order', flat=True)),
+            list(range(5)),
+        )
+
+    def test_file_field_key_binds_upload(self):
+        modules_json = json.dumps([{
+            'title': 'Module', 'description': 'desc',
+            'chapters': [{'title': 'Chapter', 'contents': [
+                {'content_type': 'document', 'content_title': 'Doc', 'fileFieldKey': 'file_0'},
+            ]}],
+        }])
+        self.post_course(modules_json, file_0=SimpleUploadedFile('notes.txt', b'hello'))
+        content = ChapterContent.objects.get(content_title='Doc')
+        self.assertTrue(content.file.name.startswith('chapter_contents/notes'))
+        self.assertEqual(content.file.read(), b'hello')
+
+
+class CounterTests(NestedCreateTests):
+    def counters(self, course):
+        course.refresh_from_db()
+        return (
+            course.module_count, course.chapter_count, course.content_count,
+            course.enrolled_count, course.completed_count,
+        )
+
+    def assertCountersMatchSource(self, course):
+        stored = self.counters(course)
+        recompute_counters([course.pk])
+        self.assertEqual(stored, self.counters(course))
+
+    def test_nested_create_sets_counters_without_extra_queries(self):
+        response, _ = self.post_course(self.modules_payload(3, 2, 4))
+        course = Course.objects.get(pk=response.data['id'])
+        self.assertEqual(self.counters(course), (3, 6, 24, 0, 0))
+        module = course.modules.first()
+        self.assertEqual((module.chapter_count, module.content_count), (2, 8))
+        self.assertCountersMatchSource(course)
+
+    def test_single_row_writes_and_cascading_deletes(self):
+        course = build_catalogue(self.instructor, 1, modules=2, chapters=2, contents=2)[0]
+        module = course.modules.first()
+        chapter = Chapter.objects.create(module=module, title="Extra")
+        ChapterContent.objects.create(chapter=chapter, content_type='text', content_title="T", text="x")
+        self.assertEqual(self.counters(course)[:3], (2, 5, 9))
+        module.refresh_from_db()
+        self.assertEqual((module.chapter_count, module.content_count), (3, 5))
+
+        chapter.delete()
+        self.assertEqual(self.counters(course)[:3], (2, 4, 8))
+        module.delete()
+        self.assertEqual(self.counters(course)[:3], (1, 2, 4))
+        self.assertCountersMatchSource(course)
+
+    def test_cascades_shift_counters_once(self):
+        def counter_updates():
+            tables = ('UPDATE "courses_course"', 'UPDATE "courses_module"')
+            return [q for q in ctx.captured_queries if q['sql'].startswith(tables)]
+        course = build_catalogue(self.instructor, 1, modules=2, chapters=3, contents=4)[0]
+        with CaptureQueriesContext(connection) as ctx:
+            course.modules.first().delete()
+        self.assertEqual(len(counter_updates()), 1)
+        self.assertEqual(self.counters(course)[:3], (1, 3, 12))
+        self.assertCountersMatchSource(course)
+
+        chapter = Chapter.objects.filter(module__course=course).first()
+        with CaptureQueriesContext(connection) as ctx:
+            chapter.delete()
+        self.assertEqual(len(counter_updates()), 2)  # module and course
+        self.assertEqual(self.counters(course)[:3], (1, 2, 8))
+
+        with CaptureQueriesContext(connection) as ctx:
+            course.delete()
+        self.assertEqual(counter_updates(), [])
+
+    def test_nested_module_and_chapter_create(self):
+        course = build_catalogue(self.instructor, 1, modules=1, chapters=0, contents=0)[0]
+        payload = json.loads(self.modules_payload(1, 2, 3))[0]
+        serializer = ModuleSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        module = serializer.save(course=course)
+        self.assertEqual(self.counters(course)[:3], (2, 2, 6))
+
+        response = self.client.post(
+            f'/courses/courses/{course.pk}/modules/{module.pk}/chapters/',
+            payload['chapters'][0], format='json', secure=True,
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.counters(course)[:3], (2, 3, 9))
+        self.assertCountersMatchSource(course)
+
+    def test_enrollment_and_completion_counters(self):
+        course = build_catalogue(self.instructor, 1, modules=2, chapters=0, contents=0)[0]
+        students = [
+            CustomUser.objects.create_user(
+                username=f"student{i}", email=f"student{i}@example.com", password="pass",
+                role=CustomUser.Roles.STUDENT,
+            )
+            for i in range(3)
+        ]
+        enrollments = [Enrollment.objects.create(user=student, course=course) for student in students]
+        self.assertEqual(self.counters(course)[3:], (3, 0))
+
+        for module in course.modules.all():
+            record_progress(students[0], module, 100)
+        enrollments[1].status = 'completed'
+        enrollments[1].save()
+        enrollments[1].save()
+        self.assertEqual(self.counters(course)[3:], (3, 2))
+
+        enrollments[1].delete()
+        enrollments[2].delete()
+        self.assertEqual(self.counters(course)[3:], (1, 1))
+        self.assertCountersMatchSource(course)
+
+    def test_recompute_command_repairs_drift(self):
+        course = build_catalogue(self.instructor, 1, modules=2, chapters=2, contents=2)[0]
+        Course.objects.filter(pk=course.pk).update(module_count=40, content_count=0)
+        Module.objects.filter(course=course).update(chapter_count=0)
+        call_command('recompute_course_counters', str(course.pk), stdout=StringIO())
+        self.assertEqual(self.counters(course), (2, 4, 8, 0, 0))
+        self.assertEqual(
+            list(course.modules.values_list('chapter_count', flat=True)), [2, 2],
+        )
+
+
+class ProgressWriteTests(StudentTestCase):
+    def enrolled_course(self, modules):
+        course = build_catalogue(self.instructor, 1, modules=modules, chapters=0, contents=0)[0]
+        Enrollment.objects.create(user=self.student, course=course)
+        return course, list(course.modules.order_by('order'))
+
+    def patch(self, module, progress):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(
+                f'/courses/courses/{module.course_id}/modules/{module.id}/progress/patch_progress/',
+                {'progress': progress}, format='json', secure=True,
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        return len(ctx.captured_queries)
+
+    def enrollment(self, course):
+        return Enrollment.objects.get(user=self.student, course=course)
+
+    def test_completion_is_tracked_incrementally(self):
+        course, modules = self.enrolled_course(3)
+        self.patch(modules[0], 100)
+        self.patch(modules[0], 100)
+        self.patch(modules[1], 40)
+        self.assertEqual(self.enrollment(course).completed_modules, 1)
+        self.assertEqual(self.enrollment(course).status, 'in-progress')
+
+        self.patch(modules[1], 100)
+        self.patch(modules[2], 100)
+        enrollment = self.enrollment(course)
+        self.assertEqual(enrollment.completed_modules, 3)
+        self.assertEqual(enrollment.status, 'completed')
+
+    def test_deleting_a_completed_module_decrements(self):
+        course, modules = self.enrolled_course(3)
+        self.patch(modules[0], 100)
+        modules[0].delete()
+        self.assertEqual(self.enrollment(course).completed_modules, 0)
+
+        self.patch(modules[1], 100)
+        enrollment = self.enrollment(course)
+        self.assertEqual(enrollment.completed_modules, 1)
+        self.assertEqual(enrollment.status, 'in-progress')
+
+    def test_deleting_completed_progress_decrements(self):
+        course, modules = self.enrolled_course(2)
+        self.patch(modules[0], 100)
+        self.patch(modules[1], 50)
+        ModuleProgress.objects.filter(user=self.student).delete()
+        self.assertEqual(self.enrollment(course).completed_modules, 0)
+
+    def test_dropping_below_complete_decrements(self):
+        course, modules = self.enrolled_course(2)
+        self.patch(modules[0], 100)
+        self.patch(modules[0], 90)
+        self.assertEqual(self.enrollment(course).completed_modules, 0)
+
+    def test_patch_query_count_does_not_depend_on_course_size(self):
+        _, small = self.enrolled_course(2)
+        _, large = self.enrolled_course(60)
+        self.patch(small[0], 10)
+        self.patch(large[0], 10)
+        self.assertEqual(self.patch(small[0], 100), self.patch(large[0], 100))
+        self.assertEqual(self.patch(small[1], 30), self.patch(large[1], 30))
+
+    def test_enroll_seeds_counter_from_existing_progress(self):
+        course = build_catalogue(self.instructor, 1, modules=2, chapters=0, contents=0)[0]
+        module = course.modules.first()
+        self.patch(module, 100)
+        enrollment, created = Enrollment.enroll(self.student, course.id)
+        self.assertTrue(created)
+        self.assertEqual(enrollment.completed_modules, 1)
+        self.assertEqual(enrollment.status, 'in-progress')
+
+    def test_enroll_with_every_module_done_is_completed(self):
+        course = build_catalogue(self.instructor, 1, modules=2, chapters=0, contents=0)[0]
+        for module in course.modules.all():
+            self.patch(module, 100)
+        enrollment, _ = Enrollment.enroll(self.student, course.id)
+        self.assertEqual((enrollment.completed_modules, enrollment.status), (2, 'completed'))
+        self.assertEqual(Course.objects.get(pk=course.pk).completed_count, 1)
+
+    def test_deleting_the_last_unfinished_module_completes(self):
+        course, modules = self.enrolled_course(3)
+        self.patch(modules[0], 100)
+        self.patch(modules[1], 100)
+        self.patch(modules[2], 40)
+        modules[2].delete()
+        enrollment = self.enrollment(course)
+        self.assertEqual((enrollment.completed_modules, enrollment.status), (2, 'completed'))
+        self.assertEqual(Course.objects.get(pk=course.pk).completed_count, 1)
+
+    def batch(self, updates):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                '/courses/progress/batch/', {'updates': updates}, format='json', secure=True,
+            )
+        return response, ctx.captured_queries
+
+    def test_batch_upserts_in_one_statement(self):
+        course_a, modules_a = self.enrolled_course(2)
+        course_b, modules_b = self.enrolled_course(3)
+        self.patch(modules_a[0], 10)
+
+        response, queries = self.batch([
+            {'module': modules_a[0].id, 'progress': 100},
+            {'module': modules_a[1].id, 'progress': 100},
+            {'module': modules_b[0].id, 'progress': 60},
+            {'module': modules_b[0].id, 'progress': 20},
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "courses_')]), 1)
+        self.assertEqual(
+            ModuleProgress.objects.get(user=self.student, module=modules_b[0]).progress, 60
+        )
+        self.assertEqual(self.enrollment(course_a).status, 'completed')
+        self.assertEqual(self.enrollment(course_a).completed_modules, 2)
+        self.assertEqual(self.enrollment(course_b).completed_modules, 0)
+        # only course_a had a crossing
+        self.assertEqual(
+            len([q for q in queries if q['sql'].startswith('UPDATE "courses_enrollment"')]), 1
+        )
+
+    def test_batch_rejects_unknown_modules(self):
+        response, _ = self.batch([{'module': 999999, 'progress': 10}])
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.batch([])
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PROGRESS_WRITE_BEHIND=True, PROGRESS_FLUSH_INTERVAL=0, PROGRESS_FLUSH_SIZE=1000)
+class ProgressWriteBehindTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        progress_buffer.clear()
+        self.addCleanup(progress_buffer.clear)
+
+    enrolled_course = ProgressWriteTests.enrolled_course
+    enrollment = ProgressWriteTests.enrollment
+
+    def patch(self, module, progress):
+        response = self.client.patch(
+            f'/courses/courses/{module.course_id}/modules/{module.id}/progress/patch_progress/',
+            {'progress': progress}, format='json', secure=True,
+        )
+        self.assertIn(response.status_code, (200, 202), response.data)
+        return response
+
+    def stored(self, module):
+        row = ModuleProgress.objects.filter(user=self.student, module=module).first()
+        return row.progress if row else None
+
+    def test_heartbeats_are_coalesced_with_max_merge(self):
+        _, modules = self.enrolled_course(2)
+        for value in (30, 55, 40):
+            self.assertEqual(self.patch(modules[0], value).status_code, 202)
+        self.assertIsNone(self.stored(modules[0]))
+        self.assertEqual(len(progress_buffer), 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            progress_buffer.flush()
+        self.assertEqual(self.stored(modules[0]), 55)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "courses_')]), 1)
+
+    def test_flush_never_lowers_stored_progress(self):
+        _, modules = self.enrolled_course(2)
+        ModuleProgress.objects.create(user=self.student, module=modules[0], progress=70)
+        self.patch(modules[0], 20)
+        progress_buffer.flush()
+        self.assertEqual(self.stored(modules[0]), 70)
+
+    def test_completion_is_written_immediately(self):
+        course, modules = self.enrolled_course(1)
+        self.patch(modules[0], 50)
+        response = self.patch(modules[0], 100)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stored(modules[0]), 100)
+        self.assertEqual(len(progress_buffer), 0)
+        self.assertEqual(self.enrollment(course).status, 'completed')
+
+    def test_size_threshold_wakes_the_flush_thread(self):
+        class Buffer(ProgressBuffer):
+            woken = 0
+
+            def _flush_soon(self):
+                self.woken += 1
+
+        buffer = Buffer()
+        course, modules = self.enrolled_course(3)
+        module_courses = {module.pk: course.pk for module in modules}
+        with override_settings(PROGRESS_FLUSH_SIZE=2):
+            with CaptureQueriesContext(connection) as ctx:
+                buffer.add(self.student.pk, {modules[0].pk: 10}, module_courses)
+                buffer.add(self.student.pk, {modules[1].pk: 20}, module_courses)
+        # The heartbeat that fills the buffer doesn't write it in the request.
+        self.assertEqual((buffer.woken, len(buffer), len(ctx.captured_queries)), (1, 2, 0))
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual((self.stored(modules[0]), self.stored(modules[1])), (10, 20))
+
+
+class EnrollOnFirstAccessTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = build_catalogue(self.instructor, 1)[0]
+        self.path = f'/courses/courses/{self.course.id}/modules/'
+
+    def get_modules(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries]
+
+    def test_first_read_enrolls_and_repeat_reads_skip_enrollment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.get_modules()
+        self.assertTrue(Enrollment.objects.filter(user=self.student, course=self.course).exists())
+
+        queries = self.get_modules()
+        self.assertFalse(any('courses_enrollment' in sql for sql in queries))
+        self.assertEqual(Enrollment.objects.filter(user=self.student).count(), 1)
+
+    def test_unenrolling_invalidates_the_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.get_modules()
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.filter(user=self.student).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.get_modules()
+        self.assertEqual(Enrollment.objects.filter(user=self.student).count(), 1)
+
+    def test_instructors_are_not_enrolled(self):
+        self.client.force_authenticate(self.instructor)
+        self.get_modules()
+        self.assertFalse(Enrollment.objects.exists())
+
+
+class ContentDownloadTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.course = build_catalogue(self.instructor, 1)[0]
+        self.content = ChapterContent.objects.filter(chapter__module__course=self.course).first()
+        self.content.file.save("intro.mp4", ContentFile(b"0123456789" * 100))
+        self.url = f'/courses/contents/{self.content.pk}/download/'
+
+    def test_enrolled_students_can_seek(self):
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, 403)
+        Enrollment.objects.create(user=self.student, course=self.course)
+        response = self.client.get(self.url, secure=True, headers={'range': 'bytes=995-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b"56789")
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+
+    def test_access_ends_with_the_enrollment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, 200)
+        # Without its on_commit hook the cached enrolled_course_ids() is stale.
+        enrollment.delete()
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, 403)
+
+    def test_instructors_get_the_whole_file(self):
+        self.client.force_authenticate(self.instructor)
+        response = self.client.get(self.url, secure=True)
+        self.assertEqual((response.status_code, response['Content-Length']), (200, '1000'))
+        self.assertNotIn('attachment', response['Content-Disposition'])
+
+
+class CursorPaginationTests(CoursesTestCase):
+    def test_enrollments_page_by_cursor_without_count(self):
+        students = CustomUser.objects.bulk_create([
+            CustomUser(username=f"s{i}", email=f"s{i}@example.com", role=CustomUser.Roles.STUDENT)
+            for i in range(45)
+        ])
+        course = build_catalogue(self.instructor, 1, modules=0)[0]
+        Enrollment.objects.bulk_create([Enrollment(user=s, course=course) for s in students])
+
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+        url, seen = '/courses/enrollments/', []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(seen, sorted(seen, reverse=True))
@@ -26,6 +26,7 @@ urlpatterns = [
     path('', include(router.urls)),
     path('', include(courses_router.urls)),
     path('', include(modules_router.urls)),
+    path('contents/<int:pk>/download/', views.ChapterContentDownloadView.as_view(), name='content-download'),
 ]
 
 
@@ -3,23 +3,131 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 
 from .models import (
     Course, Module, Chapter, ChapterContent,
     Assignment, AssignmentSubmission, Enrollment, ModuleProgress,
 )
 from .serializers import (
-    CourseSerializer, ModuleSerializer, ChapterSerializer, ChapterContentSerializer,
+    CourseSerializer, CourseSummarySerializer, ModuleSerializer, ChapterSerializer, ChapterContentSerializer,
     AssignmentSerializer, AssignmentSubmissionSerializer, EnrollmentSerializer,
-    ModuleProgressSerializer,
+    ModuleProgressSerializer, ModuleProgressBatchSerializer,
 )
 from .permissions import IsInstructorOrAdmin, IsStudent, IsAdmin
-
-
-class CourseViewSet(viewsets.ModelViewSet):
-    queryset = Course.objects.prefetch_related('modules').select_related('instructor')
+from .pagination import (
+    SubmissionCursorPagination, EnrollmentCursorPagination, ModuleProgressCursorPagination,
+)
+from Auths.models import CustomUser
+from .shaping import ShapedViewMixin, requested_shape
+from .progress import (
+    progress_buffer, record_progress, record_progress_batch, write_behind_enabled,
+)
+from .caching import cached_render, content_version, outline_etag, request_variant
+from .enrollments import enrolled_course_ids, ensure_enrolled
+from lms1.streaming import stream_file
+
+
+class CachedOutlineMixin:
+    """
+    Serves rendered outlines from the versioned outline cache (courses/caching.py).
+
+    Read querysets come without the nested tree; the tree is loaded only for
+    the objects that miss the cache. Fields listed in `per_user_fields` are
+    kept out of the cached blob and added per request.
+
+    Single-object reads are conditional: the ETag comes from the course content
+    version and Last-Modified from `outline_last_modified()` (the owning
+    course's updated_at, which is also that version), and a matching
+    If-None-Match / If-Modified-Since returns 304 before anything is rendered.
+    """
+    outline_kind = None
+    outline_actions = ()
+    per_user_fields = ()
+
+    def load_outline_objects(self, pks):
+        """Fresh queryset, with the tree prefetched, for the given primary keys."""
+        raise NotImplementedError
+
+    def outline_last_modified(self, obj):
+        raise NotImplementedError
+
+    def outline_version(self, obj):
+        return content_version(self.outline_last_modified(obj))
+
+    def outline_variant(self):
+        fields, expand = requested_shape(self.request)
+        return request_variant(self.request, fields, expand)
+
+    def outline_user_values(self, objects):
+        serializer_fields = self.get_serializer().fields
+        names = [name for name in self.per_user_fields if name in serializer_fields]
+        return [
+            {name: serializer_fields[name].to_representation(obj) for name in names}
+            for obj in objects
+        ]
+
+    def render_outlines(self, objects):
+        variant = self.outline_variant()
+
+        def render(missing):
+            fresh = self.load_outline_objects([obj.pk for obj in missing]).in_bulk()
+            data = self.get_serializer([fresh.get(obj.pk, obj) for obj in missing], many=True).data
+            return [
+                {name: value for name, value in item.items() if name not in self.per_user_fields}
+                for item in data
+            ]
+
+        objects = list(objects)
+        rendered = cached_render(objects, self.outline_version, self.outline_kind, variant, render)
+        if not self.per_user_fields:
+            return rendered
+        return [
+            {**data, **user_values}
+            for data, user_values in zip(rendered, self.outline_user_values(objects))
+        ]
+
+    def conditional_outline_response(self, obj):
+        version = self.outline_version(obj)
+        user_values = self.outline_user_values([obj])[0] if self.per_user_fields else {}
+        etag = outline_etag(self.outline_kind, obj.pk, version, self.outline_variant(), user_values)
+        last_modified = int(self.outline_last_modified(obj).timestamp())
+
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(self.render_outlines([obj])[0])
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        if self.per_user_fields:
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if self.action not in self.outline_actions:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.render_outlines(page))
+        return Response(self.render_outlines(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.action not in self.outline_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_outline_response(self.get_object())
+
+
+class CourseViewSet(CachedOutlineMixin, ShapedViewMixin, viewsets.ModelViewSet):
+    queryset = Course.objects.select_related('instructor').order_by('id')
     serializer_class = CourseSerializer
+    tree_levels = ('modules', 'chapters', 'contents')
+    read_actions = ['list', 'retrieve', 'my_courses', 'in_progress_courses', 'completed_courses']
+    outline_kind = 'course'
+    per_user_fields = ('is_enrolled',)
 
     def get_permissions(self):
         """
@@ -37,8 +145,59 @@ class CourseViewSet(viewsets.ModelViewSet):
         else:
             return [permissions.AllowAny()]
 
+    def is_summary_view(self):
+        """
+        ?view=summary returns catalogue cards with tree counts instead of the
+        full module/chapter/content tree.
+        """
+        return (
+            self.action in self.read_actions
+            and self.request.query_params.get('view') == 'summary'
+        )
+
+    def get_queryset(self):
+        if self.is_summary_view():
+            return Course.objects.select_related('instructor').order_by('id')
+        if self.action in self.outline_actions:
+            # The tree is loaded by render_outlines() for cache misses only.
+            return super().get_queryset()
+        return super().get_queryset().with_tree(self.get_tree_depth())
+
+    @property
+    def outline_actions(self):
+        return [] if self.is_summary_view() else self.read_actions
+
+    def outline_last_modified(self, course):
+        return course.updated_at
+
+    def load_outline_objects(self, pks):
+        return self.queryset.with_tree(self.get_tree_depth()).filter(pk__in=pks)
+
+    def course_response(self, courses):
+        if self.is_summary_view():
+            return Response(self.get_serializer(courses, many=True).data)
+        return Response(self.render_outlines(courses))
+
+    def get_serializer_class(self):
+        if self.is_summary_view():
+            return CourseSummarySerializer
+        return super().get_serializer_class()
+
     def get_serializer_context(self):
-        return {"request": self.request}
+        return {
+            "request": self.request,
+            "enrolled_course_ids": self.get_enrolled_course_ids(),
+        }
+
+    def get_enrolled_course_ids(self):
+        """
+        IDs of the courses the requesting user is enrolled in, resolved once per
+        request (from the per-user cache) so CourseSerializer.is_enrolled never
+        queries per course.
+        """
+        if not hasattr(self, '_enrolled_course_ids'):
+            self._enrolled_course_ids = enrolled_course_ids(self.request.user)
+        return self._enrolled_course_ids
 
     def perform_create(self, serializer):
         serializer.save(instructor=self.request.user)
@@ -46,75 +205,81 @@ class CourseViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsInstructorOrAdmin])
     def my_courses(self, request):
         """Return only the courses created by request.user if they're instructor/admin."""
-        courses = self.queryset.filter(instructor=request.user)
-        serializer = self.get_serializer(courses, many=True)
-        return Response(serializer.data)
+        courses = self.get_queryset().filter(instructor=request.user)
+        return self.course_response(courses)
 
     @action(detail=False, methods=['get'], permission_classes=[IsStudent])
     def in_progress_courses(self, request):
         enrollments = Enrollment.objects.filter(user=request.user, status='in-progress')
         course_ids = enrollments.values_list('course_id', flat=True)
-        courses = self.queryset.filter(id__in=course_ids)
-        serializer = self.get_serializer(courses, many=True)
-        return Response(serializer.data)
+        courses = self.get_queryset().filter(id__in=course_ids)
+        return self.course_response(courses)
 
     @action(detail=False, methods=['get'], permission_classes=[IsStudent])
     def completed_courses(self, request):
         enrollments = Enrollment.objects.filter(user=request.user, status='completed')
         course_ids = enrollments.values_list('course_id', flat=True)
-        courses = self.queryset.filter(id__in=course_ids)
-        serializer = self.get_serializer(courses, many=True)
-        return Response(serializer.data)
-class ModuleViewSet(viewsets.ModelViewSet):
+        courses = self.get_queryset().filter(id__in=course_ids)
+        return self.course_response(courses)
+class ModuleViewSet(CachedOutlineMixin, ShapedViewMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsStudent | IsInstructorOrAdmin]
     serializer_class = ModuleSerializer
+    tree_levels = ('chapters', 'contents')
+    outline_kind = 'module'
+    outline_actions = ('list', 'retrieve', 'detailed_view')
+
+    def outline_last_modified(self, module):
+        return module.course.updated_at
+
+    def load_outline_objects(self, pks):
+        return Module.objects.with_tree(self.get_tree_depth()).filter(pk__in=pks)
 
     def get_queryset(self):
-        print("DEBUG: Entered ModuleViewSet.get_queryset() for user:", self.request.user)
-        queryset = Module.objects.select_related('course').order_by('order')
+        queryset = Module.objects.select_related('course').order_by('order', 'id')
+        if self.action not in self.outline_actions:
+            queryset = queryset.with_tree(self.get_tree_depth())
         course_id = self.kwargs.get('course_pk')
-
         if course_id:
             queryset = queryset.filter(course_id=course_id)
+        return queryset
 
-            # AUTO-ENROLL logic
-            if (self.request.user.is_authenticated 
-                and hasattr(self.request.user, 'profile') 
-                and self.request.user.profile.role == 'student'):
-                
-                enrollment, created = Enrollment.objects.get_or_create(
-                    user=self.request.user,
-                    course_id=course_id,
-                    defaults={'status': 'in-progress'}
-                )
-                
-                if created:
-                    print(
-                        f"DEBUG: Created new enrollment for user={self.request.user} in course_id={course_id}"
-                    )
-                else:
-                    print(
-                        f"DEBUG: Enrollment already exists for user={self.request.user} in course_id={course_id}"
-                    )
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.enroll_on_first_access()
 
-        return queryset
+    def enroll_on_first_access(self):
+        """
+        AUTO-ENROLL: a student reading a course's modules is enrolled in it.
+        Backed by the per-user enrolled-course cache, so repeat reads do no
+        enrollment query at all.
+        """
+        user = self.request.user
+        if not (user.is_authenticated and user.role == CustomUser.Roles.STUDENT):
+            return
+        if self.request.method not in permissions.SAFE_METHODS:
+            return
+        try:
+            course_id = int(self.kwargs.get('course_pk'))
+        except (TypeError, ValueError):
+            return
+        ensure_enrolled(user, course_id)
 
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def detailed_view(self, request, course_pk=None, pk=None):
-        module = get_object_or_404(Module, course_id=course_pk, id=pk)
-        serializer = self.get_serializer(module)
-        return Response(serializer.data)
+        module = get_object_or_404(Module.objects.select_related('course'), course_id=course_pk, id=pk)
+        return self.conditional_outline_response(module)
 
 
-class ChapterViewSet(viewsets.ModelViewSet):
-    queryset = Chapter.objects.all()
+class ChapterViewSet(ShapedViewMixin, viewsets.ModelViewSet):
+    queryset = Chapter.objects.order_by('order', 'id')
     serializer_class = ChapterSerializer
+    tree_levels = ('contents',)
     permission_classes = [permissions.IsAuthenticated, IsInstructorOrAdmin]
 
     def get_queryset(self):
         # Filter by module if in nested route
         module_id = self.kwargs.get('module_pk')
-        qs = super().get_queryset()
+        qs = super().get_queryset().with_tree(self.get_tree_depth())
         if module_id:
             qs = qs.filter(module_id=module_id)
         return qs
@@ -138,6 +303,7 @@ class AssignmentSubmissionViewSet(viewsets.ModelViewSet):
     queryset = AssignmentSubmission.objects.all().select_related('assignment', 'student')
     serializer_class = AssignmentSubmissionSerializer
     permission_classes = [permissions.IsAuthenticated, IsStudent]
+    pagination_class = SubmissionCursorPagination
 
     def perform_create(self, serializer):
         assignment_id = self.kwargs.get('assignment_pk')
@@ -154,6 +320,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
     queryset = Enrollment.objects.all()
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EnrollmentCursorPagination
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -173,6 +340,7 @@ class ModuleProgressViewSet(viewsets.ModelViewSet):
     serializer_class = ModuleProgressSerializer
 
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ModuleProgressCursorPagination
 
     def get_queryset(self):
         """
@@ -208,7 +376,8 @@ class ModuleProgressViewSet(viewsets.ModelViewSet):
 
         1) get_or_create user’s ModuleProgress record.
         2) Update with the given progress.
-        3) Check if ALL modules in the course are at 100% => mark the Enrollment as completed.
+        3) If the module crossed 100%, update the Enrollment's completed_modules
+           counter and mark it completed once every module is done.
         """
         progress_val = request.data.get('progress')
         if progress_val is None:
@@ -226,32 +395,72 @@ class ModuleProgressViewSet(viewsets.ModelViewSet):
         # Confirm the module belongs to that course
         module = get_object_or_404(Module, pk=module_pk, course__pk=course_pk)
 
-        # Upsert the ModuleProgress
-        module_progress, created = ModuleProgress.objects.get_or_create(
-            user=request.user,
-            module=module
-        )
-        module_progress.progress = progress_val
-        module_progress.save()
-
-        # ---------------------------------------------
-        # Check if user now has 100% in ALL modules of this course
-        # ---------------------------------------------
-        total_modules = Module.objects.filter(course=module.course).count()
-        completed_modules = ModuleProgress.objects.filter(
-            user=request.user,
-            module__course=module.course,
-            progress=100
-        ).count()
-
-        if total_modules > 0 and completed_modules == total_modules:
-            # Mark user’s enrollment as completed (if it exists)
-            enrollment_qs = Enrollment.objects.filter(user=request.user, course=module.course)
-            if enrollment_qs.exists():
-                enrollment = enrollment_qs.first()
-                enrollment.status = 'completed'
-                enrollment.save()
+        if write_behind_enabled():
+            written = progress_buffer.add(
+                request.user.pk, {module.id: progress_val}, {module.id: module.course_id}
+            )
+            return Response(
+                {"user": request.user.pk, "module": module.id, "progress": progress_val},
+                status=200 if written else 202,
+            )
+
+        # Upsert the ModuleProgress; a crossing of the 100% threshold moves the
+        # enrollment's completed_modules counter (and status) in the same step.
+        module_progress = record_progress(request.user, module, progress_val)
 
         # Return updated progress
         serializer = self.get_serializer(module_progress)
-        return Response(serializer.data, status=200)
\ No newline at end of file
+        return Response(serializer.data, status=200)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def batch(self, request, *args, **kwargs):
+        """
+        POST /courses/progress/batch/
+        Body: { "updates": [ {"module": <id>, "progress": 0..100}, ... ] }
+
+        Upserts every update in one statement and re-evaluates completion only
+        for the courses whose modules crossed 100%.
+        """
+        serializer = ModuleProgressBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if write_behind_enabled():
+            progress_buffer.add(
+                request.user.pk,
+                serializer.validated_data['values'],
+                serializer.validated_data['module_courses'],
+            )
+            return Response({"updated": len(serializer.validated_data['values'])}, status=202)
+
+        updated = record_progress_batch(
+            request.user,
+            serializer.validated_data['values'],
+            serializer.validated_data['module_courses'],
+        )
+        return Response({"updated": updated}, status=200)
+
+
+class ChapterContentDownloadView(APIView):
+    """
+    GET /courses/contents/{id}/download/
+
+    Streams a chapter's uploaded file (lms1/streaming.py) with Range support,
+    so videos can seek. Students must be enrolled in the course; instructors
+    and admins may fetch any content.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsStudent | IsInstructorOrAdmin]
+
+    def get(self, request, pk):
+        content = get_object_or_404(ChapterContent.objects.select_related('chapter__module'), pk=pk)
+        if not content.file:
+            raise Http404("No file attached")
+        user = request.user
+        # Asked of the database rather than the enrolled_course_ids() cache,
+        # which only hears of an unenrollment once its transaction commits.
+        enrolled = Enrollment.objects.filter(user=user, course_id=content.chapter.module.course_id)
+        if user.role == CustomUser.Roles.STUDENT and not enrolled.exists():
+            return Response({"detail": "Not enrolled in this course."}, status=403)
+        return stream_file(request, content.file)
@@ -0,0 +1,125 @@
+# lms1/buffering.py
+"""
+In-process write-behind buffers: the archive view/download counters
+(Archive/counters.py) and the progress heartbeats (courses/progress.py).
+
+`WriteBehindBuffer` owns the pending dict, its lock and the timer thread
+that writes it out. A subclass says how two pending entries for the same
+key merge (`merge`) and how a swapped-out batch reaches the database
+(`write`); everything about when that happens lives here.
+
+Pending entries are written every `interval_setting` seconds, or as soon
+as `size_setting` keys are pending. Either way the write happens on the
+timer thread, never in the request that filled the buffer. An interval of
+0 turns off time-based flushing. Whatever is pending when the process
+exits is flushed by an atexit hook.
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+class WriteBehindBuffer:
+    interval_setting = None
+    default_interval = 10
+    size_setting = None
+    default_size = 500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def merge(self, current, value):
+        """The pending entry for a key that holds `current` (or None) after adding `value`."""
+        raise NotImplementedError
+
+    def write(self, pending):
+        """
+        Write a swapped-out {key: entry} batch; returns what was written.
+        Entries that fail go back through `requeue()`.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Write every pending entry to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        return self.write(pending)
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+
+    def requeue(self, entries):
+        """Merge {key: entry} that could not be written back for the next flush."""
+        with self._lock:
+            for key, value in entries.items():
+                self._pending[key] = self.merge(self._pending.get(key), value)
+
+    def flush_when_due(self):
+        """
+        Called after adding entries: wake the timer thread if the buffer is
+        full or overdue, else make sure a flush is scheduled.
+        """
+        interval = self.flush_interval()
+        with self._lock:
+            if not self._pending:
+                return
+            due = interval > 0 and time.monotonic() - self._last_flush >= interval
+            full = len(self._pending) >= self.flush_size()
+        if full or due:
+            self._flush_soon()
+        else:
+            self._schedule()
+
+    def _schedule(self):
+        interval = self.flush_interval()
+        if interval <= 0:
+            return
+        with self._lock:
+            if self._timer is not None or not self._pending:
+                return
+            self._start_timer(interval)
+
+    def _flush_soon(self):
+        """Have the timer thread flush now rather than after the interval."""
+        with self._lock:
+            if self._timer is not None:
+                if self._timer.interval == 0:
+                    return
+                self._timer.cancel()
+            self._start_timer(0)
+
+    def _start_timer(self, delay):
+        # Called with the lock held.
+        self._timer = threading.Timer(delay, self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+        self._schedule()
+
+    def flush_interval(self):
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    def flush_size(self):
+        return getattr(settings, self.size_setting, self.default_size)
@@ -96,6 +96,82 @@ DATABASES = {
     }
 }
 
+# Caches. Course outlines get their own alias so they can live in a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache or FileBasedCache)
+# while everything else stays process-local. 'shared' holds per-user state
+# that a write in one worker must drop for all of them; with more than one
+# worker, SHARED_CACHE_BACKEND has to name a backend they all reach.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'outlines': {
+        'BACKEND': os.getenv('OUTLINE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('OUTLINE_CACHE_LOCATION', 'course-outlines'),
+        'TIMEOUT': int(os.getenv('OUTLINE_CACHE_TIMEOUT', '3600')),
+    },
+    'shared': {
+        'BACKEND': os.getenv('SHARED_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('SHARED_CACHE_LOCATION', 'shared'),
+    },
+}
+
+# Cache alias for each user's enrolled course IDs (courses/enrollments.py).
+# Enrollment writes update it on commit, so it must be shared by all workers,
+# or the others serve stale is_enrolled flags for ENROLLMENT_CACHE_TIMEOUT.
+ENROLLMENT_CACHE = os.getenv('ENROLLMENT_CACHE', 'shared')
+
+# Write-behind buffering for module progress heartbeats (courses/progress.py).
+# Off by default: every PATCH is written straight to the database.
+PROGRESS_WRITE_BEHIND = os.getenv('PROGRESS_WRITE_BEHIND', 'False') == 'True'
+PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', '5'))  # seconds
+PROGRESS_FLUSH_SIZE = int(os.getenv('PROGRESS_FLUSH_SIZE', '200'))  # pending entries
+
+# Analytics rollups (menu/analytics.py): how long per-day student activity
+# rows are kept once they have been counted.
+ANALYTICS_ACTIVITY_RETENTION_DAYS = int(os.getenv('ANALYTICS_ACTIVITY_RETENTION_DAYS', '90'))
+# Cache alias for student dashboard snapshots. Progress and enrollment writes
+# drop a student's snapshot on commit, so like ENROLLMENT_CACHE it must be a
+# backend every worker shares.
+ANALYTICS_STUDENT_SNAPSHOT_CACHE = os.getenv('ANALYTICS_STUDENT_SNAPSHOT_CACHE', 'shared')
+# Seconds a student's dashboard snapshot may be served from the cache.
+ANALYTICS_STUDENT_SNAPSHOT_TIMEOUT = int(os.getenv('ANALYTICS_STUDENT_SNAPSHOT_TIMEOUT', '300'))
+
+# Archive full-text search backend (Archive/search.py). Empty picks the one
+# matching the database: tsvector + GIN on PostgreSQL, FTS5 on SQLite.
+ARCHIVE_SEARCH_BACKEND = os.getenv('ARCHIVE_SEARCH_BACKEND', '')
+
+# Text extraction for archive uploads (Archive/extraction.py): worker threads
+# (0 = extract inline), OCR for pages without a text layer, and limits.
+ARCHIVE_EXTRACTION_WORKERS = int(os.getenv('ARCHIVE_EXTRACTION_WORKERS', '2'))
+ARCHIVE_EXTRACTION_OCR = os.getenv('ARCHIVE_EXTRACTION_OCR', 'True') == 'True'
+ARCHIVE_EXTRACTION_MAX_PAGES = int(os.getenv('ARCHIVE_EXTRACTION_MAX_PAGES', '200'))
+ARCHIVE_EXTRACTION_MAX_CHARS = int(os.getenv('ARCHIVE_EXTRACTION_MAX_CHARS', '500000'))
+
+# Archive view/download counters (Archive/counters.py): hits are tallied in
+# memory and flushed as relative UPDATEs every interval or once this many
+# files are pending. Off writes each hit straight away.
+ARCHIVE_COUNTER_WRITE_BEHIND = os.getenv('ARCHIVE_COUNTER_WRITE_BEHIND', 'True') == 'True'
+ARCHIVE_COUNTER_FLUSH_INTERVAL = float(os.getenv('ARCHIVE_COUNTER_FLUSH_INTERVAL', '10'))  # seconds
+ARCHIVE_COUNTER_FLUSH_SIZE = int(os.getenv('ARCHIVE_COUNTER_FLUSH_SIZE', '500'))  # pending files
+
+# Cache alias for the category/tag facet blocks (Archive/facets.py) and their
+# version key. File changes bump the version, so with several workers this
+# must be a backend they all share (e.g. point it at 'outlines' backed by
+# Redis); with 'default' (locmem) other workers see changes only on expiry.
+ARCHIVE_FACET_CACHE = os.getenv('ARCHIVE_FACET_CACHE', 'default')
+# Seconds a category/tag facet block (Archive/facets.py) may be cached; file
+# changes invalidate it sooner.
+ARCHIVE_FACET_CACHE_TIMEOUT = int(os.getenv('ARCHIVE_FACET_CACHE_TIMEOUT', '300'))
+# Seconds each worker may serve its in-memory category/tag lists
+# (Archive/lookups.py); edits in the same worker invalidate them at once.
+ARCHIVE_LOOKUP_CACHE_TIMEOUT = int(os.getenv('ARCHIVE_LOOKUP_CACHE_TIMEOUT', '300'))
+
+# File downloads (lms1/streaming.py): when set, e.g. "/protected-media/",
+# local files are handed to nginx via X-Accel-Redirect at that internal
+# location instead of being streamed by Django.
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', '')
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -0,0 +1,173 @@
+# lms1/streaming.py
+"""
+Streaming responses for stored files: archive documents, chapter media and,
+in development, everything under MEDIA_URL.
+
+`stream_file()` never reads a file into memory. A whole file goes out as a
+FileResponse, which the WSGI server hands to its file wrapper (sendfile
+under gunicorn). A single `Range: bytes=a-b` gets a 206 streamed in chunks
+from the requested offset, so video players can seek and downloads can
+resume. Each response carries an ETag and Last-Modified from the stored
+file's size and mtime, so If-None-Match / If-Modified-Since get a 304 and
+If-Range falls back to the whole file once the file has changed.
+
+With settings.MEDIA_ACCEL_REDIRECT set (e.g. "/protected-media/"), files
+in local storage are handed to nginx with X-Accel-Redirect instead. Nginx
+then answers ranges and revalidation itself.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def byte_range(header, size):
+    """
+    The inclusive (start, end) asked for by a single-range Range header, or
+    None to send the whole file. Several ranges or a malformed header are
+    ignored, which RFC 9110 allows. Raises UnsatisfiableRange when the range
+    starts past the end of the file.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:  # the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise UnsatisfiableRange
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        raise UnsatisfiableRange
+    return start, end
+
+
+def read_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def validators(storage, name, size):
+    """(etag, last_modified timestamp) of a stored file; None for what the storage can't tell."""
+    try:
+        modified = int(storage.get_modified_time(name).timestamp())
+    except (NotImplementedError, OSError):
+        return None, None
+    return f'"{size:x}-{modified:x}"', modified
+
+
+def stream_file(request, field_file, as_attachment=False, filename=None):
+    """
+    Response streaming `field_file` for `request`, honouring Range and
+    conditional headers. Raises Http404 when the file is not in storage or
+    the name is a directory.
+    """
+    storage, name = field_file.storage, field_file.name
+    filename = filename or os.path.basename(name)
+    try:
+        size = storage.size(name)
+        if isinstance(storage, FileSystemStorage) and not os.path.isfile(storage.path(name)):
+            raise Http404("File not found")
+    except (OSError, SuspiciousFileOperation):
+        raise Http404("File not found")
+
+    etag, last_modified = validators(storage, name, size)
+    headers = {'Accept-Ranges': 'bytes'}
+    if etag:
+        headers.update({'ETag': etag, 'Last-Modified': http_date(last_modified)})
+
+    probe = HttpResponse(headers=headers)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=probe)
+    if conditional is not probe:
+        return conditional  # 304 or 412
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    disposition = content_disposition_header(as_attachment, filename)
+
+    accel = getattr(settings, 'MEDIA_ACCEL_REDIRECT', '')
+    if accel and isinstance(storage, FileSystemStorage):
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = accel.rstrip('/') + '/' + quote(name.lstrip('/'))
+        response['Content-Disposition'] = disposition
+        return response
+
+    requested = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if requested and if_range and if_range not in (etag, last_modified and http_date(last_modified)):
+        requested = None  # changed since the client's first part: start over
+    try:
+        span = byte_range(requested, size) if requested else None
+    except UnsatisfiableRange:
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    try:
+        handle = storage.open(name, 'rb')
+    except OSError:  # gone since size(), or not a regular file
+        raise Http404("File not found")
+    if span is None:
+        response = FileResponse(handle, as_attachment=as_attachment, filename=filename, headers=headers)
+        response['Content-Type'] = content_type
+        return response
+
+    start, end = span
+    response = StreamingHttpResponse(
+        read_range(handle, start, end - start + 1), status=206, content_type=content_type, headers=headers,
+    )
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Disposition'] = disposition
+    return response
+
+
+def is_full_download(request, response):
+    """
+    Whether a response starts a download: a GET for the whole file or for a
+    range from its first byte. Seeks, resumes and revalidations don't count.
+    """
+    if request.method != 'GET':
+        return False
+    if response.status_code == 200:
+        return True
+    return response.status_code == 206 and response['Content-Range'].startswith('bytes 0-')
+
+
+class StoredFile:
+    """The storage/name pair stream_file() needs, for paths outside a FileField."""
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+
+def serve_media(request, path):
+    """Development stand-in for django.views.static.serve, with Range support."""
+    return stream_file(request, StoredFile(default_storage, path))
@@ -2,9 +2,10 @@
 import os
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from .streaming import serve_media
 
 urlpatterns = [
     # Admin URL
@@ -26,8 +27,8 @@ urlpatterns = [
 # ------------------------------------------------------------------
 # Serve uploaded media while developing *and* when running on Vercel
 # ------------------------------------------------------------------
+# Streamed with Range support (lms1/streaming.py), not read into memory.
 if settings.DEBUG or os.getenv("VERCEL"):
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
+    urlpatterns += [
+        re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$", serve_media),
+    ]
@@ -0,0 +1,415 @@
+# menu/analytics.py
+"""
+Rollup tables behind the menu analytics endpoints.
+
+CourseDailyStats, InstructorStats and SiteStats are shifted by relative F()
+updates from the signals in menu/signals.py, so the dashboards read one row
+instead of counting users and enrollments. `reconcile()` rebuilds what can be
+derived from the source tables and is meant to run periodically
+(`manage.py reconcile_analytics`, e.g. from cron).
+
+Daily completions have no source of truth to rebuild from (an enrollment
+does not record when it was completed), so reconcile leaves them alone.
+
+Student dashboards are not rolled up; they are computed in one query and
+cached per user until the student's progress or enrollments change. The
+cache behind ANALYTICS_STUDENT_SNAPSHOT_CACHE must be shared by every worker,
+or only the worker that saw the change drops its copy.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FilteredRelation, Q, Sum, Value
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from courses.models import AssignmentSubmission, Course, Enrollment, Module, ModuleProgress
+from courses.progress import COMPLETE, completion_delta
+
+from .models import (
+    CourseDailyStats, CourseStats, InstructorStats, ModuleStats, SiteStats, StudentActivity,
+)
+
+User = get_user_model()
+
+ACTIVITY_RETENTION_DAYS = getattr(settings, 'ANALYTICS_ACTIVITY_RETENTION_DAYS', 90)
+STUDENT_SNAPSHOT_CACHE_ALIAS = getattr(settings, 'ANALYTICS_STUDENT_SNAPSHOT_CACHE', 'shared')
+STUDENT_SNAPSHOT_TIMEOUT = getattr(settings, 'ANALYTICS_STUDENT_SNAPSHOT_TIMEOUT', 300)
+
+
+def bump(model, lookup, **deltas):
+    """
+    Add {field: delta} to the row matching `lookup`, creating it if missing.
+    Decrements are clamped at zero, and never create a row: the row may be
+    gone because its parent is being deleted.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    expressions = {
+        name: F(name) + delta if delta > 0 else Greatest(F(name) + delta, Value(0))
+        for name, delta in deltas.items()
+    }
+    rows = model.objects.filter(**lookup)
+    if rows.update(**expressions) or max(deltas.values()) < 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{name: max(delta, 0) for name, delta in deltas.items()})
+    except IntegrityError:
+        # Created concurrently; shift the row that won.
+        rows.update(**expressions)
+
+
+def bump_daily(course_id, date, **deltas):
+    bump(CourseDailyStats, {'course_id': course_id, 'date': date}, **deltas)
+
+
+def bump_instructor(instructor_id, **deltas):
+    bump(InstructorStats, {'instructor_id': instructor_id}, **deltas)
+
+
+def bump_site(**deltas):
+    bump(SiteStats, {'pk': SiteStats.SINGLETON_PK}, **deltas)
+
+
+def bump_course(course_id, **deltas):
+    bump(CourseStats, {'course_id': course_id}, **deltas)
+
+
+def bump_module(module_id, **deltas):
+    bump(ModuleStats, {'module_id': module_id}, **deltas)
+
+
+def record_module_changes(user_id, changes):
+    """
+    Fold a progress_recorded payload into ModuleStats and
+    CourseStats.started_students. Plain heartbeats on already started,
+    incomplete modules cost nothing.
+    """
+    new_modules = {}
+    for module_id, course_id, previous, current in changes:
+        started = int(previous is None)
+        completed = completion_delta(previous or 0, current)
+        bump_module(module_id, started=started, completed=completed)
+        if started:
+            new_modules.setdefault(course_id, []).append(module_id)
+    for course_id, module_ids in new_modules.items():
+        # First progress in the course?
+        earlier = ModuleProgress.objects.filter(
+            user_id=user_id, module__course_id=course_id
+        ).exclude(module_id__in=module_ids)
+        if not earlier.exists():
+            bump_course(course_id, started_students=1)
+
+
+def recount_started_students(course_id):
+    started = (
+        ModuleProgress.objects.filter(module__course_id=course_id)
+        .values('user_id').distinct().count()
+    )
+    CourseStats.objects.filter(course_id=course_id).update(started_students=started)
+
+
+def instructor_id_of(course_id):
+    return Course.objects.filter(pk=course_id).values_list('instructor_id', flat=True).first()
+
+
+def recount_instructor_students(instructor_id):
+    students = (
+        Enrollment.objects.filter(course__instructor_id=instructor_id)
+        .values('user_id').distinct().count()
+    )
+    InstructorStats.objects.filter(pk=instructor_id).update(total_students=students)
+
+
+def mark_active(user_id, course_ids, date=None):
+    """
+    Record that the user worked on the courses today. Only the first call
+    per user, course and day touches the database; the cache remembers the
+    rest, and the unique StudentActivity row keeps the count exact when the
+    cache forgets.
+    """
+    date = date or timezone.localdate()
+    cache = caches['default']
+    for course_id in course_ids:
+        if not cache.add(f'analytics:active:{course_id}:{user_id}:{date}', True, timeout=60 * 60 * 24):
+            continue
+        _, created = StudentActivity.objects.get_or_create(course_id=course_id, user_id=user_id, date=date)
+        if created:
+            bump_daily(course_id, date, active_students=1)
+
+
+# ----------------------------------
+#       Reads
+# ----------------------------------
+
+def site_stats():
+    stats = SiteStats.objects.filter(pk=SiteStats.SINGLETON_PK).first()
+    return stats or reconcile_site_stats()
+
+
+def instructor_stats(instructor_id):
+    stats = InstructorStats.objects.filter(pk=instructor_id).first()
+    return stats or reconcile_instructor_stats([instructor_id])[0]
+
+
+def percentage(progress_sum, module_count):
+    """Share of `module_count` modules at 100%, from the sum of their progress."""
+    return round(progress_sum / module_count) if module_count else 0
+
+
+def compute_student_snapshot(user_id):
+    """
+    Per-course and overall progress of a student in one grouped query: the
+    user's enrollments joined to their own ModuleProgress rows only. Overall
+    progress is weighted by each course's module count.
+    """
+    rows = (
+        Enrollment.objects.filter(user_id=user_id)
+        .alias(own_progress=FilteredRelation(
+            'course__modules__progresses',
+            condition=Q(course__modules__progresses__user_id=user_id),
+        ))
+        .order_by('enrolled_at', 'id')
+        .values('course_id', 'course__title', 'course__module_count', 'status')
+        .annotate(progress_sum=Sum('own_progress__progress'))
+    )
+    courses = []
+    progress_total = module_total = 0
+    for row in rows:
+        progress_sum = row['progress_sum'] or 0
+        progress_total += progress_sum
+        module_total += row['course__module_count']
+        courses.append({
+            "courseId": row['course_id'],
+            "title": row['course__title'],
+            "status": row['status'],
+            "progressPercentage": percentage(progress_sum, row['course__module_count']),
+        })
+    return {
+        "coursesEnrolled": len(courses),
+        "completedCourses": sum(course['status'] == 'completed' for course in courses),
+        "progressPercentage": percentage(progress_total, module_total),
+        "courses": courses,
+    }
+
+
+def _student_key(user_id):
+    return f'analytics:student:{user_id}'
+
+
+def student_snapshot(user_id):
+    """Cached compute_student_snapshot(); dropped whenever the student's progress or enrollments change."""
+    cache = caches[STUDENT_SNAPSHOT_CACHE_ALIAS]
+    snapshot = cache.get(_student_key(user_id))
+    if snapshot is None:
+        snapshot = compute_student_snapshot(user_id)
+        cache.set(_student_key(user_id), snapshot, STUDENT_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def invalidate_student_snapshot(user_id):
+    transaction.on_commit(lambda: caches[STUDENT_SNAPSHOT_CACHE_ALIAS].delete(_student_key(user_id)))
+
+
+def course_funnels(courses):
+    """
+    Drill-down rows for a page of courses, read from Course's counters and
+    the CourseStats / ModuleStats rollups: one query for all of the page's
+    modules, none per course. Expects `courses` with select_related('stats').
+    """
+    modules = {}
+    for module in (
+        Module.objects.filter(course__in=courses)
+        .select_related('stats')
+        .order_by('course_id', 'order', 'id')
+    ):
+        stats = getattr(module, 'stats', None)
+        modules.setdefault(module.course_id, []).append({
+            "moduleId": module.pk,
+            "title": module.title,
+            "started": stats.started if stats else 0,
+            "completed": stats.completed if stats else 0,
+        })
+    rows = []
+    for course in courses:
+        stats = getattr(course, 'stats', None)
+        rows.append({
+            "courseId": course.pk,
+            "title": course.title,
+            "enrolled": course.enrolled_count,
+            "started": stats.started_students if stats else 0,
+            "completed": course.completed_count,
+            "pendingGrading": stats.pending_submissions if stats else 0,
+            "modules": modules.get(course.pk, []),
+        })
+    return rows
+
+
+# ----------------------------------
+#       Reconcile
+# ----------------------------------
+
+def reconcile_site_stats():
+    counts = User.objects.aggregate(
+        total=Count('pk'), active=Count('pk', filter=Q(is_active=True))
+    )
+    stats, _ = SiteStats.objects.update_or_create(
+        pk=SiteStats.SINGLETON_PK,
+        defaults={'total_users': counts['total'], 'active_users': counts['active']},
+    )
+    return stats
+
+
+def reconcile_instructor_stats(instructor_ids=None):
+    """
+    Rebuild InstructorStats with two grouped queries and one upsert. Without
+    `instructor_ids`, every instructor with a course or an existing row.
+    """
+    courses = Course.objects.order_by()
+    enrollments = Enrollment.objects.order_by()
+    if instructor_ids is not None:
+        courses = courses.filter(instructor_id__in=instructor_ids)
+        enrollments = enrollments.filter(course__instructor_id__in=instructor_ids)
+        ids = set(instructor_ids)
+    else:
+        ids = set(InstructorStats.objects.values_list('pk', flat=True))
+
+    course_counts = dict(
+        courses.values('instructor_id').annotate(total=Count('pk')).values_list('instructor_id', 'total')
+    )
+    student_counts = dict(
+        enrollments.values('course__instructor_id')
+        .annotate(total=Count('user_id', distinct=True))
+        .values_list('course__instructor_id', 'total')
+    )
+    ids |= course_counts.keys()
+    rows = [
+        InstructorStats(
+            instructor_id=instructor_id,
+            total_courses=course_counts.get(instructor_id, 0),
+            total_students=student_counts.get(instructor_id, 0),
+            updated_at=timezone.now(),
+        )
+        for instructor_id in sorted(ids)
+    ]
+    return InstructorStats.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['instructor'],
+        update_fields=['total_courses', 'total_students', 'updated_at'],
+    )
+
+
+def reconcile_funnel_stats():
+    """
+    Rebuild CourseStats and ModuleStats with grouped queries over
+    ModuleProgress and AssignmentSubmission.
+    """
+    started = dict(
+        ModuleProgress.objects.order_by().values('module__course_id')
+        .annotate(total=Count('user_id', distinct=True))
+        .values_list('module__course_id', 'total')
+    )
+    pending = dict(
+        AssignmentSubmission.objects.filter(grade__isnull=True).order_by()
+        .values('assignment__module__course_id').annotate(total=Count('pk'))
+        .values_list('assignment__module__course_id', 'total')
+    )
+    modules = {
+        row['module_id']: row
+        for row in ModuleProgress.objects.order_by().values('module_id').annotate(
+            started=Count('pk'), completed=Count('pk', filter=Q(progress__gte=COMPLETE)),
+        )
+    }
+    with transaction.atomic():
+        CourseStats.objects.bulk_create(
+            [
+                CourseStats(
+                    course_id=course_id,
+                    started_students=started.get(course_id, 0),
+                    pending_submissions=pending.get(course_id, 0),
+                )
+                for course_id in Course.objects.values_list('pk', flat=True)
+            ],
+            update_conflicts=True,
+            unique_fields=['course'],
+            update_fields=['started_students', 'pending_submissions'],
+            batch_size=1000,
+        )
+        ModuleStats.objects.bulk_create(
+            [
+                ModuleStats(
+                    module_id=module_id,
+                    started=modules.get(module_id, {}).get('started', 0),
+                    completed=modules.get(module_id, {}).get('completed', 0),
+                )
+                for module_id in Module.objects.values_list('pk', flat=True)
+            ],
+            update_conflicts=True,
+            unique_fields=['module'],
+            update_fields=['started', 'completed'],
+            batch_size=1000,
+        )
+
+
+def reconcile_daily_stats(days=30):
+    """
+    Rebuild enrollments and active_students of the last `days` days from
+    Enrollment.enrolled_at and StudentActivity.
+    """
+    since = timezone.localdate() - datetime.timedelta(days=days - 1)
+    totals = {}
+    enrolled = (
+        Enrollment.objects.filter(enrolled_at__date__gte=since)
+        .annotate(date=TruncDate('enrolled_at'))
+        .order_by()
+        .values('course_id', 'date')
+        .annotate(total=Count('pk'))
+    )
+    for row in enrolled:
+        totals.setdefault((row['course_id'], row['date']), {})['enrollments'] = row['total']
+    active = (
+        StudentActivity.objects.filter(date__gte=since)
+        .order_by()
+        .values('course_id', 'date')
+        .annotate(total=Count('pk'))
+    )
+    for row in active:
+        totals.setdefault((row['course_id'], row['date']), {})['active_students'] = row['total']
+
+    with transaction.atomic():
+        CourseDailyStats.objects.filter(date__gte=since).update(enrollments=0, active_students=0)
+        CourseDailyStats.objects.bulk_create(
+            [
+                CourseDailyStats(
+                    course_id=course_id, date=date,
+                    enrollments=values.get('enrollments', 0),
+                    active_students=values.get('active_students', 0),
+                )
+                for (course_id, date), values in totals.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['course', 'date'],
+            update_fields=['enrollments', 'active_students'],
+        )
+    return len(totals)
+
+
+def prune_activity(days=ACTIVITY_RETENTION_DAYS):
+    """Drop StudentActivity rows older than the retention window."""
+    cutoff = timezone.localdate() - datetime.timedelta(days=days)
+    return StudentActivity.objects.filter(date__lt=cutoff).delete()[0]
+
+
+def reconcile(days=30):
+    reconcile_site_stats()
+    reconcile_instructor_stats()
+    reconcile_funnel_stats()
+    daily = reconcile_daily_stats(days)
+    pruned = prune_activity()
+    return {'daily_rows': daily, 'pruned_activity': pruned}
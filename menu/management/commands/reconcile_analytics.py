@@ -0,0 +1,24 @@
+# menu/management/commands/reconcile_analytics.py
+from django.core.management.base import BaseCommand
+
+from menu.analytics import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the analytics rollups (site and instructor totals, recent "
+        "per-course daily stats) from the source tables. Run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help="How many recent days of per-course daily stats to rebuild.",
+        )
+
+    def handle(self, *args, **options):
+        result = reconcile(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {result['daily_rows']} daily row(s); "
+            f"pruned {result['pruned_activity']} activity row(s)."
+        ))
@@ -0,0 +1,113 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    SiteStats = apps.get_model('menu', 'SiteStats')
+    InstructorStats = apps.get_model('menu', 'InstructorStats')
+    CourseDailyStats = apps.get_model('menu', 'CourseDailyStats')
+
+    users = User.objects.aggregate(total=Count('pk'), active=Count('pk', filter=Q(is_active=True)))
+    SiteStats.objects.create(pk=1, total_users=users['total'], active_users=users['active'])
+
+    courses = dict(
+        Course.objects.order_by().values('instructor_id').annotate(total=Count('pk'))
+        .values_list('instructor_id', 'total')
+    )
+    students = dict(
+        Enrollment.objects.order_by().values('course__instructor_id')
+        .annotate(total=Count('user_id', distinct=True))
+        .values_list('course__instructor_id', 'total')
+    )
+    InstructorStats.objects.bulk_create([
+        InstructorStats(
+            instructor_id=instructor_id,
+            total_courses=total,
+            total_students=students.get(instructor_id, 0),
+        )
+        for instructor_id, total in courses.items()
+    ])
+
+    # Completions and active students have no history to rebuild from.
+    CourseDailyStats.objects.bulk_create(
+        [
+            CourseDailyStats(course_id=row['course_id'], date=row['date'], enrollments=row['total'])
+            for row in Enrollment.objects.annotate(date=TruncDate('enrolled_at'))
+            .order_by().values('course_id', 'date').annotate(total=Count('pk'))
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Auths', '0005_customuser_role'),
+        ('courses', '0012_denormalized_counters'),
+        ('menu', '0002_helptopic_notification_usersetting'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstructorStats',
+            fields=[
+                ('instructor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analytics', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_courses', models.PositiveIntegerField(default=0)),
+                ('total_students', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Instructor stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='SiteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('active_users', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Site stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+                ('completions', models.PositiveIntegerField(default=0)),
+                ('active_students', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='courses.course')),
+            ],
+            options={
+                'verbose_name_plural': 'Course daily stats',
+                'constraints': [models.UniqueConstraint(fields=('course', 'date'), name='unique_course_daily_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Student activity',
+                'constraints': [models.UniqueConstraint(fields=('course', 'date', 'user'), name='unique_student_activity')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_funnel_stats(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Module = apps.get_model('courses', 'Module')
+    ModuleProgress = apps.get_model('courses', 'ModuleProgress')
+    AssignmentSubmission = apps.get_model('courses', 'AssignmentSubmission')
+    CourseStats = apps.get_model('menu', 'CourseStats')
+    ModuleStats = apps.get_model('menu', 'ModuleStats')
+
+    started = dict(
+        ModuleProgress.objects.order_by().values('module__course_id')
+        .annotate(total=Count('user_id', distinct=True))
+        .values_list('module__course_id', 'total')
+    )
+    pending = dict(
+        AssignmentSubmission.objects.filter(grade__isnull=True).order_by()
+        .values('assignment__module__course_id').annotate(total=Count('pk'))
+        .values_list('assignment__module__course_id', 'total')
+    )
+    CourseStats.objects.bulk_create(
+        [
+            CourseStats(
+                course_id=course_id,
+                started_students=started.get(course_id, 0),
+                pending_submissions=pending.get(course_id, 0),
+            )
+            for course_id in Course.objects.values_list('pk', flat=True)
+        ],
+        batch_size=1000,
+    )
+    modules = {
+        row['module_id']: row
+        for row in ModuleProgress.objects.order_by().values('module_id').annotate(
+            started=Count('pk'), completed=Count('pk', filter=Q(progress__gte=100)),
+        )
+    }
+    ModuleStats.objects.bulk_create(
+        [
+            ModuleStats(
+                module_id=module_id,
+                started=modules.get(module_id, {}).get('started', 0),
+                completed=modules.get(module_id, {}).get('completed', 0),
+            )
+            for module_id in Module.objects.values_list('pk', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_denormalized_counters'),
+        ('menu', '0003_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.course')),
+                ('started_students', models.PositiveIntegerField(default=0)),
+                ('pending_submissions', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Course stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='ModuleStats',
+            fields=[
+                ('module', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.module')),
+                ('started', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Module stats',
+            },
+        ),
+        migrations.RunPython(backfill_funnel_stats, migrations.RunPython.noop),
+    ]
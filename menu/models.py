@@ -1,7 +1,7 @@
 # wishlist/models.py
 from django.db import models
 from django.conf import settings
-from courses.models import Course  # Import the Course model
+from courses.models import Course, Module
 
 class Wishlist(models.Model):
     user = models.ForeignKey(
@@ -59,3 +59,107 @@ class UserSetting(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - Settings"
+
+
+# ----------------------------------
+#       Analytics rollups
+# ----------------------------------
+# Maintained incrementally by menu/signals.py and rebuilt by
+# `manage.py reconcile_analytics`; see menu/analytics.py.
+
+class CourseDailyStats(models.Model):
+    """
+    Per-course, per-day totals: enrollments made, enrollments completed and
+    distinct students who recorded progress.
+    """
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='daily_stats'
+    )
+    date = models.DateField()
+    enrollments = models.PositiveIntegerField(default=0)
+    completions = models.PositiveIntegerField(default=0)
+    active_students = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'date'], name='unique_course_daily_stats'),
+        ]
+        verbose_name_plural = 'Course daily stats'
+
+    def __str__(self):
+        return f"{self.course_id} @ {self.date}"
+
+
+class StudentActivity(models.Model):
+    """
+    One row per student, course and day with recorded progress; the source
+    of CourseDailyStats.active_students.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'date', 'user'], name='unique_student_activity'),
+        ]
+        verbose_name_plural = 'Student activity'
+
+
+class CourseStats(models.Model):
+    """
+    Course funnel figures that Course's own counters don't cover: students
+    with any recorded progress and submissions waiting for a grade.
+    """
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    started_students = models.PositiveIntegerField(default=0)
+    pending_submissions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Course stats'
+
+
+class ModuleStats(models.Model):
+    """
+    Students who started / completed (100%) a module.
+    """
+    module = models.OneToOneField(
+        Module, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    started = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Module stats'
+
+
+class InstructorStats(models.Model):
+    """
+    Courses taught and distinct students enrolled across them, per instructor.
+    """
+    instructor = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        primary_key=True, related_name='analytics',
+    )
+    total_courses = models.PositiveIntegerField(default=0)
+    total_students = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Instructor stats'
+
+
+class SiteStats(models.Model):
+    """
+    Site-wide user counts, kept in a single row (pk=1).
+    """
+    total_users = models.PositiveIntegerField(default=0)
+    active_users = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    SINGLETON_PK = 1
+
+    class Meta:
+        verbose_name_plural = 'Site stats'
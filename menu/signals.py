@@ -0,0 +1,171 @@
+# menu/signals.py
+"""
+Keep the analytics rollups (menu/analytics.py) in step with users, courses,
+enrollments and progress. The shifts run in the writer's transaction, so a
+rolled back write never shows up in the dashboards.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from courses.models import (
+    Assignment, AssignmentSubmission, Course, Enrollment, Module, ModuleProgress,
+)
+from courses.progress import COMPLETE
+from courses.signals import deleted_with, enrollment_completed, on_commit_once, progress_recorded
+
+from .analytics import (
+    bump_course, bump_daily, bump_instructor, bump_module, bump_site, instructor_id_of,
+    invalidate_student_snapshot, mark_active, recount_instructor_students, recount_started_students,
+    record_module_changes,
+)
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=User)
+def remember_user_active(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._stored_is_active = None
+    if instance.pk is None or raw:
+        return
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    instance._stored_is_active = (
+        User.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        bump_site(total_users=1, active_users=int(instance.is_active))
+        return
+    stored = getattr(instance, '_stored_is_active', None)
+    if stored is not None and stored != instance.is_active:
+        bump_site(active_users=1 if instance.is_active else -1)
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    bump_site(total_users=-1, active_users=-int(instance.is_active))
+
+
+@receiver(post_save, sender=Course)
+def count_course(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_instructor(instance.instructor_id, total_courses=1)
+
+
+@receiver(post_delete, sender=Course)
+def uncount_course(sender, instance, **kwargs):
+    # Its enrollments were deleted (and uncounted) just before.
+    bump_instructor(instance.instructor_id, total_courses=-1)
+
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    bump_daily(instance.course_id, timezone.localdate(instance.enrolled_at), enrollments=1)
+    instructor_id = instructor_id_of(instance.course_id)
+    other_courses = Enrollment.objects.filter(
+        user_id=instance.user_id, course__instructor_id=instructor_id
+    ).exclude(pk=instance.pk)
+    if not other_courses.exists():
+        bump_instructor(instructor_id, total_students=1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Course):  # the course's daily rows go with it
+        bump_daily(instance.course_id, timezone.localdate(instance.enrolled_at), enrollments=-1)
+    instructor_id = instructor_id_of(instance.course_id)
+    if instructor_id is not None:
+        # Deleting a user sends this for each of their enrollments only after
+        # all of them are gone, so recount rather than decrement, and only
+        # once per instructor however many enrollments the delete took.
+        on_commit_once(
+            ('menu-instructor-students', instructor_id),
+            lambda: recount_instructor_students(instructor_id),
+        )
+
+
+@receiver(enrollment_completed)
+def count_completion(sender, user_id, course_id, **kwargs):
+    bump_daily(course_id, timezone.localdate(), completions=1)
+
+
+@receiver(progress_recorded)
+def count_active_student(sender, user_id, course_ids, **kwargs):
+    mark_active(user_id, course_ids)
+
+
+@receiver(progress_recorded)
+def count_module_progress(sender, user_id, changes=(), **kwargs):
+    record_module_changes(user_id, changes)
+
+
+@receiver(post_delete, sender=ModuleProgress)
+def uncount_module_progress(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, Course):  # its course and module stats go with it
+        return
+    if not deleted_with(origin, Module):
+        bump_module(instance.module_id, started=-1, completed=-int(instance.progress >= COMPLETE))
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        # Same as for enrollments: recount, since a queryset delete signals
+        # each row only after all of them are gone, once per course.
+        on_commit_once(
+            ('menu-started-students', course_id),
+            lambda: recount_started_students(course_id),
+        )
+
+
+def course_id_of_assignment(assignment_id):
+    return (
+        Assignment.objects.filter(pk=assignment_id).values_list('module__course_id', flat=True).first()
+    )
+
+
+@receiver(pre_save, sender=AssignmentSubmission)
+def remember_submission_grade(sender, instance, raw=False, **kwargs):
+    instance._stored_ungraded = None
+    if instance.pk is not None and not raw:
+        stored = AssignmentSubmission.objects.filter(pk=instance.pk).values('grade').first()
+        if stored is not None:
+            instance._stored_ungraded = stored['grade'] is None
+
+
+@receiver(post_save, sender=AssignmentSubmission)
+def count_pending_submission(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    ungraded = instance.grade is None
+    was_ungraded = False if created else getattr(instance, '_stored_ungraded', None)
+    if was_ungraded is None or ungraded == was_ungraded:
+        return
+    course_id = course_id_of_assignment(instance.assignment_id)
+    if course_id is not None:
+        bump_course(course_id, pending_submissions=1 if ungraded else -1)
+
+
+@receiver(post_delete, sender=AssignmentSubmission)
+def uncount_pending_submission(sender, instance, **kwargs):
+    if instance.grade is None:
+        course_id = course_id_of_assignment(instance.assignment_id)
+        if course_id is not None:
+            bump_course(course_id, pending_submissions=-1)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def drop_student_snapshot_on_enrollment(sender, instance, **kwargs):
+    invalidate_student_snapshot(instance.user_id)
+
+
+@receiver(progress_recorded)
+def drop_student_snapshot_on_progress(sender, user_id, **kwargs):
+    invalidate_student_snapshot(user_id)
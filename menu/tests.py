@@ -1,3 +1,279 @@
+from django.core.cache import caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from Auths.models import CustomUser
+from courses.models import Assignment, AssignmentSubmission, Course, Module, ModuleProgress, Enrollment
+from courses.progress import record_progress, record_progress_batch
+from .analytics import STUDENT_SNAPSHOT_CACHE_ALIAS, reconcile
+from .models import (
+    CourseDailyStats, CourseStats, InstructorStats, ModuleStats, SiteStats, StudentActivity,
+)
+
+
+def make_user(name, role=CustomUser.Roles.STUDENT, **extra):
+    return CustomUser.objects.create_user(
+        username=name, email=f"{name}@example.com", password="pass", role=role, **extra,
+    )
+
+
+def recounts(queries, table, field):
+    """How many of the captured queries rewrote `field` of the `table` rollup."""
+    return sum(q['sql'].startswith(f'UPDATE "{table}" SET "{field}"') for q in queries)
+
+
+class AnalyticsTestCase(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        caches[STUDENT_SNAPSHOT_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.instructor = make_user("instructor", CustomUser.Roles.INSTRUCTOR)
+        self.courses = [
+            Course.objects.create(title=f"Course {i}", description="desc", instructor=self.instructor)
+            for i in range(2)
+        ]
+        self.students = [make_user(f"student{i}") for i in range(3)]
+
+    def snapshot(self):
+        """Every rollup value, for comparing incremental state with a reconcile."""
+        return (
+            list(SiteStats.objects.values_list('total_users', 'active_users')),
+            list(InstructorStats.objects.order_by('pk').values_list('pk', 'total_courses', 'total_students')),
+            list(
+                CourseDailyStats.objects.order_by('course_id', 'date')
+                .values_list('course_id', 'date', 'enrollments', 'active_students')
+            ),
+        )
+
+
+class RollupMaintenanceTests(AnalyticsTestCase):
+    def test_site_stats_follow_users(self):
+        self.assertEqual(SiteStats.objects.get().total_users, 4)
+        self.students[0].is_active = False
+        self.students[0].save()
+        self.students[0].save()
+        self.students[1].delete()
+        stats = SiteStats.objects.get()
+        self.assertEqual((stats.total_users, stats.active_users), (3, 2))
+
+    def test_instructor_counts_distinct_students(self):
+        for student in self.students[:2]:
+            for course in self.courses:
+                Enrollment.objects.create(user=student, course=course)
+        stats = InstructorStats.objects.get(pk=self.instructor.pk)
+        self.assertEqual((stats.total_courses, stats.total_students), (2, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.filter(user=self.students[0], course=self.courses[0]).get().delete()
+        self.assertEqual(InstructorStats.objects.get(pk=self.instructor.pk).total_students, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.courses[1].delete()
+        stats = InstructorStats.objects.get(pk=self.instructor.pk)
+        self.assertEqual((stats.total_courses, stats.total_students), (1, 1))
+
+        Enrollment.objects.create(user=self.students[2], course=self.courses[0])
+        Course.objects.create(title="Third", description="desc", instructor=self.instructor)
+        Enrollment.objects.create(user=self.students[2], course=Course.objects.get(title="Third"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.students[2].delete()
+        self.assertEqual(InstructorStats.objects.get(pk=self.instructor.pk).total_students, 1)
+
+    def test_cascades_recount_students_once(self):
+        for course in self.courses:
+            Enrollment.objects.create(user=self.students[0], course=course)
+            Enrollment.objects.create(user=self.students[1], course=course)
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.filter(user=self.students[0]).delete()
+            self.students[1].delete()
+        self.assertEqual(recounts(ctx.captured_queries, 'menu_instructorstats', 'total_students'), 1)
+        self.assertEqual(InstructorStats.objects.get(pk=self.instructor.pk).total_students, 0)
+
+    def test_daily_enrollments_completions_and_active_students(self):
+        course = self.courses[0]
+        module = Module.objects.create(course=course, title="Only", description="desc")
+        for student in self.students:
+            Enrollment.objects.create(user=student, course=course)
+        record_progress(self.students[0], module, 40)
+        record_progress(self.students[0], module, 100)
+        record_progress(self.students[1], module, 10)
+
+        day = CourseDailyStats.objects.get(course=course, date=timezone.localdate())
+        self.assertEqual((day.enrollments, day.completions, day.active_students), (3, 1, 2))
+        self.assertEqual(StudentActivity.objects.filter(course=course).count(), 2)
+
+    def test_reconcile_matches_incremental_state(self):
+        module = Module.objects.create(course=self.courses[0], title="Only", description="desc")
+        for student in self.students:
+            Enrollment.objects.create(user=student, course=self.courses[0])
+        Enrollment.objects.create(user=self.students[0], course=self.courses[1])
+        record_progress(self.students[2], module, 50)
+        incremental = self.snapshot()
+
+        SiteStats.objects.update(total_users=0)
+        InstructorStats.objects.all().delete()
+        CourseDailyStats.objects.update(enrollments=7, active_students=0)
+        reconcile()
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class AnalyticsEndpointTests(AnalyticsTestCase):
+    def test_admin_dashboard_reads_one_row(self):
+        admin = make_user("admin", CustomUser.Roles.ADMIN, is_staff=True)
+        self.client.force_authenticate(admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/menu/menu/admin/dashboard/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['totalUsers'], response.data['activeUsers']), (5, 5))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_instructor_analytics_reads_one_row(self):
+        for student in self.students:
+            Enrollment.objects.create(user=student, course=self.courses[0])
+        self.client.force_authenticate(self.instructor)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/menu/menu/analytics/instructor/', secure=True)
+        self.assertEqual((response.data['totalCourses'], response.data['totalStudents']), (2, 3))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_missing_rollup_row_is_rebuilt_on_read(self):
+        InstructorStats.objects.all().delete()
+        self.client.force_authenticate(self.instructor)
+        response = self.client.get('/menu/menu/analytics/instructor/', secure=True)
+        self.assertEqual(response.data['totalCourses'], 2)
+        self.assertTrue(InstructorStats.objects.filter(pk=self.instructor.pk).exists())
+
+
+class StudentAnalyticsTests(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = self.students[0]
+        self.client.force_authenticate(self.student)
+        # Course 0 has 4 modules, course 1 has 1.
+        self.modules = [
+            [Module.objects.create(course=course, title=f"M{m}", description="desc") for m in range(count)]
+            for course, count in zip(self.courses, (4, 1))
+        ]
+        for course in self.courses:
+            Enrollment.objects.create(user=self.student, course=course)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/menu/menu/analytics/student/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_progress_is_weighted_by_module_count(self):
+        record_progress(self.student, self.modules[0][0], 100)
+        record_progress(self.student, self.modules[0][1], 60)
+        record_progress(self.student, self.modules[1][0], 100)
+        # Other students' progress must not leak in.
+        Enrollment.objects.create(user=self.students[1], course=self.courses[0])
+        record_progress(self.students[1], self.modules[0][2], 100)
+
+        data, _ = self.get()
+        self.assertEqual(data['coursesEnrolled'], 2)
+        self.assertEqual(data['completedCourses'], 1)
+        self.assertEqual(
+            [(course['courseId'], course['progressPercentage']) for course in data['courses']],
+            [(self.courses[0].pk, 40), (self.courses[1].pk, 100)],
+        )
+        # (100 + 60 + 100) / 5 modules
+        self.assertEqual(data['progressPercentage'], 52)
+
+    def test_snapshot_is_cached_until_progress_changes(self):
+        data, queries = self.get()
+        self.assertEqual(data['progressPercentage'], 0)
+        _, cached_queries = self.get()
+        self.assertEqual(queries - cached_queries, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_progress(self.student, self.modules[1][0], 100)
+        data, _ = self.get()
+        self.assertEqual(data['progressPercentage'], 20)
+        self.assertEqual(data['completedCourses'], 1)
+
+
+class InstructorDrillDownTests(AnalyticsTestCase):
+    url = '/menu/menu/analytics/instructor/courses/'
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.courses[0]
+        self.modules = [
+            Module.objects.create(course=self.course, title=f"M{m}", description="desc", order=m)
+            for m in range(3)
+        ]
+        for student in self.students:
+            Enrollment.objects.create(user=student, course=self.course)
+        record_progress(self.students[0], self.modules[0], 100)
+        record_progress(self.students[0], self.modules[1], 30)
+        record_progress_batch(
+            self.students[1],
+            {self.modules[0].pk: 100, self.modules[2].pk: 50},
+            {module.pk: self.course.pk for module in self.modules},
+        )
+        assignment = Assignment.objects.create(module=self.modules[0], title="A", description="desc")
+        self.submissions = [
+            AssignmentSubmission.objects.create(assignment=assignment, student=student, text="answer")
+            for student in self.students
+        ]
+        self.client.force_authenticate(self.instructor)
+
+    def funnel(self, course_id=None):
+        response = self.client.get(self.url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        rows = {row['courseId']: row for row in response.data['results']}
+        return rows[course_id or self.course.pk]
+
+    def test_funnel_from_rollups(self):
+        self.submissions[0].grade = 80
+        self.submissions[0].save()
+        self.submissions[1].delete()
+        row = self.funnel()
+        self.assertEqual(
+            (row['enrolled'], row['started'], row['completed'], row['pendingGrading']), (3, 2, 0, 1)
+        )
+        self.assertEqual(
+            [(module['started'], module['completed']) for module in row['modules']],
+            [(2, 2), (1, 0), (1, 0)],
+        )
+        empty = self.funnel(self.courses[1].pk)
+        self.assertEqual((empty['enrolled'], empty['started'], empty['modules']), (0, 0, []))
+
+    def test_deleted_progress_leaves_the_funnel(self):
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            ModuleProgress.objects.filter(user=self.students[1]).delete()
+        self.assertEqual(recounts(ctx.captured_queries, 'menu_coursestats', 'started_students'), 1)
+        row = self.funnel()
+        self.assertEqual(row['started'], 1)
+        self.assertEqual(row['modules'][0]['completed'], 1)
+
+    def test_reconcile_matches_incremental_state(self):
+        def state():
+            return (
+                list(CourseStats.objects.order_by('pk').values_list('pk', 'started_students', 'pending_submissions')),
+                list(ModuleStats.objects.order_by('pk').values_list('pk', 'started', 'completed')),
+            )
+        incremental = state()
+        CourseStats.objects.update(started_students=9, pending_submissions=0)
+        ModuleStats.objects.all().delete()
+        reconcile()
+        rebuilt = state()
+        # reconcile also writes zero rows for courses/modules without activity
+        self.assertEqual([row for row in rebuilt[0] if row[1:] != (0, 0)], incremental[0])
+        self.assertEqual([row for row in rebuilt[1] if row[1:] != (0, 0)], incremental[1])
+
+    def test_page_query_count_is_constant(self):
+        for i in range(30):
+            course = Course.objects.create(title=f"Extra {i}", description="desc", instructor=self.instructor)
+            Module.objects.create(course=course, title="M", description="desc")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url + '?page_size=25', secure=True)
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertEqual(response.data['count'], 32)
+        # COUNT + courses with stats + modules with stats
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertNotIn('moduleprogress', ' '.join(q['sql'] for q in ctx.captured_queries).lower())
@@ -3,7 +3,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     WishlistViewSet,
-    admin_dashboard, instructor_analytics, student_analytics,
+    admin_dashboard, instructor_analytics, instructor_course_analytics, student_analytics,
     menu_settings, menu_notifications, menu_help
 )
 
@@ -14,6 +14,7 @@ urlpatterns = [
     path("", include(router.urls)),
     path("menu/admin/dashboard/", admin_dashboard, name="menu-admin-dashboard"),
     path("menu/analytics/instructor/", instructor_analytics, name="menu-instructor-analytics"),
+    path("menu/analytics/instructor/courses/", instructor_course_analytics, name="menu-instructor-course-analytics"),
     path("menu/analytics/student/", student_analytics, name="menu-student-analytics"),
     path("menu/settings/", menu_settings, name="menu-settings"),
     path("menu/notifications/", menu_notifications, name="menu-notifications"),
@@ -4,9 +4,11 @@ from rest_framework.response import Response
 from django.db.models import Count, Avg
 from django.contrib.auth import get_user_model
 
+from .analytics import course_funnels, instructor_stats, site_stats, student_snapshot
 from .models import Wishlist
+from .pagination import InstructorCoursePagination
 from .serializers import WishlistSerializer
-from courses.models import Course, Enrollment
+from courses.models import Course
 # If you track module progress:
 # from courses.models import ModuleProgress
 
@@ -34,9 +36,9 @@ def admin_dashboard(request):
       - activeUsers (# of is_active)
       - pendingRequests (if you store them or 0 otherwise)
       - revenue => now omitted or set to 0 since no Payment model
+    User counts come from the SiteStats rollup (menu/analytics.py).
     """
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_active=True).count()
+    stats = site_stats()
 
     pending_requests = 0  # or logic if you track requests
     # e.g. from .models import InstructorRequest
@@ -44,8 +46,8 @@ def admin_dashboard(request):
 
     # No Payment logic => set to 0
     data = {
-        "totalUsers": total_users,
-        "activeUsers": active_users,
+        "totalUsers": stats.total_users,
+        "activeUsers": stats.active_users,
         "pendingRequests": pending_requests,
         "revenue": 0,  # Since you don't have payment
     }
@@ -67,20 +69,37 @@ def instructor_analytics(request):
     # if request.user.role != 'INSTRUCTOR':
     #     return Response({"detail": "Not an instructor"}, status=403)
 
-    instructor_courses = Course.objects.filter(instructor=request.user)
-    total_courses = instructor_courses.count()
-
-    total_students = Enrollment.objects.filter(course__in=instructor_courses) \
-                                       .values('user').distinct().count()
+    # Read from the InstructorStats rollup (menu/analytics.py)
+    stats = instructor_stats(request.user.pk)
 
     data = {
-        "totalCourses": total_courses,
-        "totalStudents": total_students,
+        "totalCourses": stats.total_courses,
+        "totalStudents": stats.total_students,
         # rating is omitted => we can do
         "averageRating": 0.0,
     }
     return Response(data)
 
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def instructor_course_analytics(request):
+    """
+    Per-course drill-down for the instructor's courses, paginated:
+      - enrolled / started / completed students
+      - per-module started and completed counts
+      - pendingGrading => submissions without a grade
+    Read from the counters and rollups only; a page costs the same number
+    of queries whatever its size.
+    """
+    courses = (
+        Course.objects.filter(instructor=request.user)
+        .select_related('stats')
+        .order_by('-created_at', '-id')
+    )
+    paginator = InstructorCoursePagination()
+    page = paginator.paginate_queryset(courses, request)
+    return paginator.get_paginated_response(course_funnels(page))
+
 # ----------------------------------
 #       Student Analytics
 # ----------------------------------
@@ -91,31 +110,14 @@ def student_analytics(request):
     For students:
       - coursesEnrolled => # of enrollments
       - completedCourses => # with status='completed'
-      - progressPercentage => average from ModuleProgress if you have it; else 0
+      - progressPercentage => overall progress, weighted by module count
+      - courses => per-course progress
+    Computed in one query and cached per user (menu/analytics.py).
     """
     # if request.user.role != 'STUDENT':
     #    return Response({"detail": "Not a student"}, status=403)
 
-    courses_enrolled = Enrollment.objects.filter(user=request.user).count()
-
-    completed_courses = Enrollment.objects.filter(
-        user=request.user, 
-        status='completed'
-    ).count()
-
-    # If you don't have ModuleProgress, just do 0.
-    # If you do, you can do:
-    # from courses.models import ModuleProgress
-    # progress_qs = ModuleProgress.objects.filter(user=request.user)
-    # avg_progress = progress_qs.aggregate(val=Avg('progress'))['val'] or 0
-    avg_progress = 0  # or real logic if you have progress
-
-    data = {
-        "coursesEnrolled": courses_enrolled,
-        "completedCourses": completed_courses,
-        "progressPercentage": int(avg_progress),
-    }
-    return Response(data)
+    return Response(student_snapshot(request.user.pk))
 
 # ----------------------------------
 #       Settings Endpoint